@@ -1 +1,7 @@
-from .src import calcbsimpvol
\ No newline at end of file
+import sys
+
+from .src import calcbsimpvol, calcbsimpvol_flat, calcbsimpvol_black76, ImpliedVolSolver, Profile, solve_stream
+from .src import ResultCache
+from .src import CONVERGED, BELOW_INTRINSIC, ABOVE_UPPER_BOUND, OUTSIDE_DOMAIN, NOT_CONVERGED, REASONS
+if sys.version_info >= (3, 5):
+    from .src import AsyncImpliedVolSolver
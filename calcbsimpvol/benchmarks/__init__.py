@@ -0,0 +1,14 @@
+"""
+Benchmark suite
+===============
+Throughput, per-stage timings and peak memory of the solver on the bundled data sets
+(`calcbsimpvol.data`) and on synthetic chains of 1, 100, 10k and 1M options.
+The results are written as JSON, so that they can be compared across releases::
+
+    python -m calcbsimpvol.benchmarks --output results.json
+    python -m calcbsimpvol.benchmarks --sizes 100 10000 --engines numpy numba --repeat 5
+
+see `suite.run` for the layout of a result
+"""
+from .suite import run, main
+from .chains import synthetic_chain, black_scholes
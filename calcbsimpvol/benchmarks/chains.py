@@ -0,0 +1,32 @@
+"""
+Synthetic option chains, shared by the benchmarks and the tests
+"""
+import numpy as np
+from scipy.special import ndtr
+
+
+def black_scholes(cp, S, K, tau, r, q, sigma):
+    """ Black-Scholes price of calls (cp = +1) and puts (cp = -1), takes ndarrays or scalars """
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * tau) / (sigma * np.sqrt(tau))
+    d2 = d1 - sigma * np.sqrt(tau)
+    return cp * (S * np.exp(-q * tau) * ndtr(cp * d1) - K * np.exp(-r * tau) * ndtr(cp * d2))
+
+
+def synthetic_chain(n, seed=0):
+    """ `n` random calls and puts priced with Black-Scholes
+
+    Returns:
+        tuple: dict of the flat arguments cp, P, S, K, tau, r, q of `calcbsimpvol_flat`,
+            and the implied volatility of the options
+
+    """
+    rng = np.random.RandomState(seed)
+    cp = rng.choice([-1, 1], n)
+    S = rng.uniform(50, 150, n)
+    K = S * np.exp(rng.uniform(-0.4, 0.4, n))
+    tau = rng.uniform(0.05, 2, n)
+    r = rng.uniform(0, 0.05, n)
+    q = rng.uniform(0, 0.03, n)
+    sigma = rng.uniform(0.1, 0.6, n)
+    P = black_scholes(cp, S, K, tau, r, q, sigma)
+    return dict(cp=cp, P=P, S=S, K=K, tau=tau, r=r, q=q), sigma
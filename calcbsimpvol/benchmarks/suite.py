@@ -0,0 +1,139 @@
+"""
+Benchmark cases and runner, see `calcbsimpvol.benchmarks`
+
+Every case is a list of flat argument lists of `calcbsimpvol_flat`. The bundled data sets
+are solved day by day (one solve per day), a synthetic chain in a single solve.
+"""
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+
+import numpy as np
+
+from .. import data
+from ..data.loader import read_columns, split_days
+from ..src.calcbsimpvol import calcbsimpvol_flat
+from ..src.profiling import Profile
+from .chains import synthetic_chain
+
+# number of options of the synthetic chains
+SIZES = (1, 100, 10000, 1000000)
+
+
+def cases(sizes=SIZES, datasets=data.DATASETS):
+    """ benchmark cases, {name: list of flat argument lists}, see module docstring """
+    result = dict()
+    for name in datasets:
+        columns = read_columns(name, data.FEED_KEYS)
+        result[name] = [[fields[key] for key in data.FEED_KEYS] for _, fields in split_days(columns)]
+    for n in sizes:
+        args, _ = synthetic_chain(n)
+        result['synthetic_{}'.format(n)] = [[args[key] for key in data.FEED_KEYS]]
+    return result
+
+
+def measure(solves, repeat=3, **kwargs):
+    """ throughput, stage timings and peak memory of a benchmark case
+    solves (list): flat argument lists of `calcbsimpvol_flat`, solved one after the other
+    repeat (int): the best of `repeat` runs is reported
+    kwargs: passed on to `calcbsimpvol_flat`, e.g. engine='numba' or seed='table'
+
+    Returns:
+        dict: options, solves, seconds (best run), options_per_second, stages (`Profile.summary`
+            of a run) and peak_bytes (peak of the memory traced by `tracemalloc` during a run)
+
+    """
+    def run_once():
+        for args in solves:
+            calcbsimpvol_flat(*args, **kwargs)
+
+    # warm-up, e.g. compiles the numba engine or builds the table of `seed='table'`
+    run_once()
+    best = np.inf
+    for _ in range(repeat):
+        start = perf_counter()
+        run_once()
+        best = min(best, perf_counter() - start)
+
+    with Profile() as profile:
+        run_once()
+
+    tracemalloc.start()
+    try:
+        run_once()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    n = int(sum(np.size(args[1]) for args in solves))
+    return dict(
+        options=n,
+        solves=len(solves),
+        seconds=best,
+        options_per_second=n / best,
+        stages=profile.summary(),
+        peak_bytes=peak,
+    )
+
+
+def run(sizes=SIZES, datasets=data.DATASETS, engines=('numpy',), seeds=('rational',), repeat=3):
+    """ runs every case with every engine and seed
+
+    Returns:
+        dict: `environment` (versions, platform and time of the run) and `results`,
+            a list of the dicts of `measure` with the keys `case`, `engine` and `seed` added
+
+    """
+    results = []
+    for case, solves in cases(sizes, datasets).items():
+        for engine in engines:
+            for seed in seeds:
+                result = dict(case=case, engine=engine, seed=seed)
+                result.update(measure(solves, repeat=repeat, engine=engine, seed=seed))
+                results.append(result)
+    return dict(environment=_environment(), results=results)
+
+
+def _environment():
+    """ what the results depend on besides the code """
+    try:
+        from importlib.metadata import version
+        package_version = version('calcbsimpvol')
+    except ImportError:
+        package_version = None
+    return dict(
+        calcbsimpvol=package_version,
+        python=platform.python_version(),
+        numpy=np.__version__,
+        platform=platform.platform(),
+        processor=platform.processor(),
+        time=datetime.now(timezone.utc).isoformat(),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m calcbsimpvol.benchmarks', description=__doc__)
+    parser.add_argument('--sizes', nargs='*', type=int, default=list(SIZES), help='options of the synthetic chains')
+    parser.add_argument('--datasets', nargs='*', default=list(data.DATASETS), choices=data.DATASETS)
+    parser.add_argument('--engines', nargs='*', default=['numpy'], choices=['numpy', 'numba', 'jaeckel'])
+    parser.add_argument('--seeds', nargs='*', default=['rational'], choices=['rational', 'table'])
+    parser.add_argument('--repeat', type=int, default=3, help='best of REPEAT runs')
+    parser.add_argument('--output', help='JSON file of the results, printed to stdout if not given')
+    options = parser.parse_args(argv)
+
+    report = run(options.sizes, options.datasets, options.engines, options.seeds, options.repeat)
+    if options.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return report
+    with open(options.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for result in report['results']:
+        print('{case:>20} {engine:>8} {seed:>8}: {options_per_second:12.0f} options/s, peak {peak_bytes} bytes'.format(
+            **result
+        ))
+    return report
@@ -76,6 +76,37 @@ SPY options data with expiry on 18. Jan, 2019
 
 **q**: trailing 12 month dividend yield ESTIMATE
 
+
+see `calcbsimpvol.data.loader` to read these (or larger files of the same layout) into NumPy columns
 """
 
 
+import json
+import os
+import zipfile
+
+# the bundled data sets, see `path`
+DATASETS = ('reference_sample', 'spy_20190118', 'cl_20171115')
+# inputs of `calcbsimpvol`, one list per day in each data set
+FEED_KEYS = ('cp', 'P', 'S', 'K', 'tau', 'r', 'q')
+
+
+def path(name):
+    """ absolute path of the zipped JSON file of a bundled data set, independent of the working directory
+    name (str): one of `DATASETS`, e.g. 'spy_20190118'
+    """
+    if name not in DATASETS:
+        raise ValueError('unknown data set: {}, expected one of {}'.format(name, ', '.join(DATASETS)))
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), '{}.json.zip'.format(name))
+
+
+def load(name):
+    """ parsed JSON of a bundled data set, {day: {key: list}}
+    name (str): one of `DATASETS`, or the path of a zipped JSON file of the same layout
+    """
+    file_path = path(name) if name in DATASETS else name
+    with zipfile.ZipFile(file_path, 'r') as zf:
+        file_names = zf.namelist()
+        if len(file_names) != 1:
+            raise ValueError('expected archive to have only one file')
+        return json.loads(zf.read(file_names[0]))
@@ -0,0 +1,279 @@
+"""
+Columnar loader of data sets in the layout of the bundled ones
+
+The zipped JSON files hold ``{day: {key: [values], ...}, ...}``. The archive is read in chunks and
+decoded day by day with `json`, so only a single day is held as Python objects at a time. Its lists
+are converted into float64 arrays and the days are concatenated into one contiguous column per key::
+
+    from calcbsimpvol.data.loader import load_columns, split_days
+    columns = load_columns('spy_20190118', cache='spy_cache')
+    for day, args in split_days(columns):
+        sigma = calcbsimpvol_flat(*[args[key] for key in FEED_KEYS])
+
+With `cache`, the columns are converted once into a directory of ``.npy`` files, one per key.
+Repeat runs memory-map these files and skip the JSON entirely.
+
+Every key of a day has to be a flat list of numbers (`null` is read as NaN, `true` / `false` as 1 / 0)
+or a single number, which is broadcast to the length of the day. Other values, e.g. strings or nested
+objects, are skipped.
+"""
+import io
+import json
+import os
+import zipfile
+
+from numpy import array, asarray, cumsum, empty, float64, full, intp, load, nan, ndim, save, size, zeros
+
+from . import DATASETS, path
+
+_DECODER = json.JSONDecoder()
+_LAYOUT = 'expected the layout {day: {key: [values]}}'
+# marks a complete cache, written last
+_META = 'meta.json'
+
+
+def read_columns(source, keys=None):
+    """ parses a zipped JSON file into contiguous columns
+    source (str): one of `DATASETS`, or the path of a zipped JSON file of the same layout
+    keys (iterable): keys to read, all of them by default, keys missing on a day are NaN
+
+    Returns:
+        dict: `days`, the labels of the days, `offsets`, day i is offsets[i]:offsets[i + 1]
+            of each column, and `columns`, {key: float64 ndarray}
+
+    """
+    days = []
+    fields = []
+    for day, day_fields in iter_days(source, keys):
+        days.append(day)
+        fields.append(day_fields)
+
+    if keys is None:
+        keys = []
+        for day_fields in fields:
+            keys.extend(key for key in day_fields if key not in keys)
+    offsets = zeros(len(days) + 1, dtype=intp)
+    cumsum([_length(day_fields) for day_fields in fields], out=offsets[1:])
+    columns = dict()
+    for key in keys:
+        column = empty(offsets[-1])
+        for i, day_fields in enumerate(fields):
+            column[offsets[i]:offsets[i + 1]] = day_fields.get(key, nan)
+        columns[key] = column
+    return dict(days=asarray(days, dtype=str), offsets=offsets, columns=columns)
+
+
+def iter_days(source, keys=None, chunk_size=2 ** 20):
+    """ parses a zipped JSON file day by day, only a day and a chunk of the file are held in memory
+    source (str): one of `DATASETS`, or the path of a zipped JSON file of the same layout
+    keys (iterable): keys to read, all keys of each day by default, keys missing on a day are NaN
+    chunk_size (int): bytes read from the archive at a time
+
+    Yields:
+        (day, {key: float64 ndarray})
+
+    """
+    wanted = None if keys is None else list(keys)
+    for day, fields in _scan(source, None if keys is None else set(wanted), chunk_size):
+        n = _length(fields)
+        if n is None:
+            raise ValueError('the lists of day {} differ in length'.format(day))
+        yield day, {
+            key: full(n, fields.get(key, nan)) if ndim(fields.get(key)) == 0 else fields[key]
+            for key in (fields if wanted is None else wanted)
+        }
+
+
+def split_days(columns):
+    """ iterates over the days of `read_columns`, yields (day, {key: view on the column}) """
+    offsets = columns['offsets']
+    for i, day in enumerate(columns['days']):
+        start, stop = offsets[i], offsets[i + 1]
+        yield str(day), {key: column[start:stop] for key, column in columns['columns'].items()}
+
+
+def write_cache(columns, directory):
+    """ writes the columns of `read_columns` into `directory`, one ``.npy`` file per key """
+    os.makedirs(directory, exist_ok=True)
+    meta = os.path.join(directory, _META)
+    if os.path.exists(meta):
+        os.remove(meta)
+    save(os.path.join(directory, 'days.npy'), columns['days'])
+    save(os.path.join(directory, 'offsets.npy'), columns['offsets'])
+    keys = list(columns['columns'])
+    for i, key in enumerate(keys):
+        # keys are not necessarily valid file names
+        save(os.path.join(directory, 'column_{}.npy'.format(i)), columns['columns'][key])
+    with open(meta, 'w') as f:
+        json.dump(dict(keys=keys, source=columns.get('source')), f)
+
+
+def read_cache(directory, mmap_mode='r'):
+    """ reads the columns written by `write_cache`, memory-mapped (read-only) by default
+
+    Returns:
+        dict: see `read_columns`, `None` if there is no complete cache in `directory`
+
+    """
+    meta = os.path.join(directory, _META)
+    if not os.path.exists(meta):
+        return None
+    with open(meta) as f:
+        meta = json.load(f)
+    columns = {
+        key: load(os.path.join(directory, 'column_{}.npy'.format(i)), mmap_mode=mmap_mode)
+        for i, key in enumerate(meta['keys'])
+    }
+    return dict(
+        days=load(os.path.join(directory, 'days.npy')),
+        offsets=load(os.path.join(directory, 'offsets.npy')),
+        columns=columns,
+        source=meta['source'],
+    )
+
+
+def load_columns(source, keys=None, cache=None, mmap_mode='r'):
+    """ columns of a data set, see `read_columns`, converted once into a cache directory
+
+    Args:
+        source (str): one of `DATASETS`, or the path of a zipped JSON file of the same layout
+        keys (iterable): keys to return, all of them by default
+        cache (str): directory of the binary columns, rebuilt if `source` changed since
+        mmap_mode (str): of the cached columns, see `numpy.load`, `None` reads them into memory
+
+    Returns:
+        dict: `days`, `offsets` and `columns`, see `read_columns`
+
+    """
+    if cache is None:
+        return read_columns(source, keys)
+    stamp = _stamp(source)
+    columns = read_cache(cache, mmap_mode)
+    if columns is None or columns['source'] != stamp:
+        # all keys are cached, so that the cache serves any subset of them
+        columns = read_columns(source)
+        columns['source'] = stamp
+        write_cache(columns, cache)
+        if mmap_mode is not None:
+            columns = read_cache(cache, mmap_mode)
+    if keys is not None:
+        columns['columns'] = {
+            key: columns['columns'][key] if key in columns['columns'] else full(columns['offsets'][-1], nan)
+            for key in keys
+        }
+    return columns
+
+
+def _file_path(source):
+    return path(source) if source in DATASETS else source
+
+
+def _scan(source, wanted, chunk_size):
+    """ yields (day, {key: ndarray or float}) of the keys in `wanted` (all if `None`), reads the archive in chunks """
+    with zipfile.ZipFile(_file_path(source), 'r') as zf:
+        file_names = zf.namelist()
+        if len(file_names) != 1:
+            raise ValueError('expected archive to have only one file')
+        with zf.open(file_names[0]) as f:
+            reader = io.TextIOWrapper(f, encoding='utf-8')
+            text = ''
+            position = 0
+            # the top level object is walked token by token, each day is decoded by `json`
+            expected = '{'
+            day = None
+            while expected is not None:
+                start = _skip_whitespace(text, position)
+                token = None
+                if start < len(text):
+                    if expected == 'key' and text[start] == '}' and day is None:
+                        # empty object
+                        break
+                    if expected in ('key', 'day'):
+                        try:
+                            token, position = _DECODER.raw_decode(text, start)
+                        except ValueError:
+                            # incomplete at the end of the text (or malformed, raised at the end of the file)
+                            pass
+                    elif text[start] in expected:
+                        token, position = text[start], start + 1
+                    else:
+                        raise ValueError(_LAYOUT)
+                if token is None:
+                    # the chunks grow with the text, so that a long day is not decoded over and over
+                    chunk = reader.read(max(chunk_size, len(text) - position))
+                    if not chunk:
+                        raise ValueError('unexpected end of file or malformed JSON after day {}'.format(day))
+                    text = text[position:] + chunk
+                    position = 0
+                    continue
+
+                if expected == '{':
+                    expected = 'key'
+                elif expected == 'key':
+                    if not isinstance(token, str):
+                        raise ValueError(_LAYOUT)
+                    day = token
+                    expected = ':'
+                elif expected == ':':
+                    expected = 'day'
+                elif expected == 'day':
+                    if not isinstance(token, dict):
+                        raise ValueError(_LAYOUT)
+                    yield day, _fields(token, wanted)
+                    expected = ',}'
+                else:
+                    expected = 'key' if token == ',' else None
+
+
+def _skip_whitespace(text, position):
+    """ position of the next character which is not whitespace, `len(text)` if there is none """
+    while position < len(text) and text[position] in ' \t\n\r':
+        position += 1
+    return position
+
+
+def _fields(day, wanted):
+    """ {key: ndarray or float} of the numeric keys of a day decoded by `json` """
+    fields = dict()
+    for key, value in day.items():
+        if wanted is not None and key not in wanted:
+            continue
+        if value is None or isinstance(value, (bool, int, float)):
+            fields[key] = nan if value is None else float(value)
+        elif isinstance(value, list):
+            column = _column(value)
+            if column is not None:
+                fields[key] = column
+    return fields
+
+
+def _column(values):
+    """ float64 ndarray of a flat list of numbers, `None` for other lists, e.g. of strings """
+    try:
+        column = array(values)
+    except ValueError:
+        # nested lists of different lengths
+        return None
+    if column.ndim != 1:
+        return None
+    if column.dtype.kind in 'biuf':
+        return column.astype(float64, copy=False)
+    if column.dtype.kind == 'O' and all(value is None or isinstance(value, (int, float)) for value in values):
+        # numbers and null
+        return column.astype(float64)
+    return None
+
+
+def _length(fields):
+    """ common length of the lists of a day, 0 without any, `None` if they differ """
+    sizes = set(size(value) for value in fields.values() if ndim(value) > 0)
+    if len(sizes) > 1:
+        return None
+    return sizes.pop() if sizes else 0
+
+
+def _stamp(source):
+    """ identifies the version of the source file the cache was built from """
+    file_path = os.path.abspath(_file_path(source))
+    stat = os.stat(file_path)
+    return [file_path, stat.st_size, stat.st_mtime_ns]
@@ -1,11 +1,8 @@
-import json
-import os
 from time import time
 import numpy as np
 import warnings
 warnings.filterwarnings("ignore")
 import optparse
-import zipfile
 try:
     import matplotlib.pyplot as plt
     from mpl_toolkits.mplot3d import Axes3D # used for 3D plotting
@@ -13,7 +10,10 @@ except ImportWarning:
     print('Could not import matplotlib - plots won\'t be created')
 
 # assumes that the package was installed in currently used environment
-from calcbsimpvol import calcbsimpvol
+from calcbsimpvol import calcbsimpvol_flat
+from calcbsimpvol.data import FEED_KEYS, load, path as data_path
+from calcbsimpvol.src.calcbsimpvol import _seed, _fcnv, _SEED_PARTITION
+from calcbsimpvol.benchmarks.chains import synthetic_chain
 
 
 def scatter3d(x, y, z, x_label=None, y_label=None, z_label=None):
@@ -49,36 +49,20 @@ def scatter2d(x, y, x_key=None, y_key=None, x_label=None, y_label=None):
     plt.show()
 
 
-def load_data(file_path):
-    with zipfile.ZipFile(file_path, 'r') as zf:
-        file_names = zf.namelist()
-        if len(file_names) != 1:
-            raise ValueError('expected archive to have only one file')
-        if file_names[0] not in file_path:
-            raise ValueError('expected file name to be part of the archive name')
-        data_string = zf.read(file_names[0])
-        return data_string
-
-
 def calc(file_path, steps=1, do_return=False):
-    data_string = load_data(file_path)
-    data = json.loads(data_string)
+    data = load(file_path)
     container = dict()
     for day in data:
         m = data[day]
         c = dict()
         c['cp'] = np.asarray(m['cp'])
         c['P'] = np.asarray(m['P'])
-        c['S'] = np.asarray(m['S'][0])
+        c['S'] = np.asarray(m['S'])
         c['K'] = np.asarray(m['K'])
         c['tau'] = np.asarray(m['tau'])
         c['r'] = np.asarray(m['r'])
         c['q'] = np.asarray(m['q'])
-
-        feed_keys = ['cp', 'P', 'K', 'tau', 'r', 'q']
-        for key in feed_keys:
-            c[key] = np.reshape(c[key], (np.size(c[key]), 1))
-            container[day] = c.copy()
+        container[day] = c
 
     elapsed = dict()
     array_size = dict()
@@ -88,10 +72,11 @@ def calc(file_path, steps=1, do_return=False):
         array_size[_step] = dict()
         for day in container:
             t_zero = time()
+            args = [container[day][key] for key in FEED_KEYS]
             if _step == 0:
-                container[day]['py_rational'] = calcbsimpvol(container[day])
+                container[day]['py_rational'] = calcbsimpvol_flat(*args)
             else:
-                calcbsimpvol(container[day])
+                calcbsimpvol_flat(*args)
             elapsed[_step][day] = time() - t_zero
             array_size[_step][day] = np.size(container[day]['cp'])
 
@@ -119,9 +104,90 @@ def calc(file_path, steps=1, do_return=False):
         return container
 
 
+def _seed_full_grid(x, c):
+    """previous seeding stage: both domains are evaluated for every option"""
+    v1 = _fcnv(x, np.maximum(c, 0))
+    v2 = _fcnv(-x, np.maximum(np.exp(x) * c + 1 - np.exp(x), 0))
+    v = np.where(x <= 0, v1, v2)
+    domain_filter = (x >= -0.5) & (x <= 0.5) & (v > 0) & (v < 1) & (x / v <= 2) & (x / v >= -2)
+    v[~domain_filter] = 0.8
+    return v
+
+
+def _seed_inputs(cp, P, S, K, tau, r, q):
+    """log forward moneyness and normalised call price of the seeding stage"""
+    S_df = S * np.exp(-q * tau)
+    K_df = K * np.exp(-r * tau)
+    P = np.where(cp == -1, P + S_df - K_df, P)
+    return np.log(S_df / K_df), np.maximum(P, 0) / S_df
+
+
+def bench_seed(file_path, steps=1, synthetic_size=1000000):
+    """compares the partitioned seeding stage with the full-grid evaluation of both domains,
+    on the days of the bundled data set and on a synthetic chain of `synthetic_size` options
+
+    Chains of less than `_SEED_PARTITION` options are seeded on the full grid as well.
+    Measured on one core, with a reused work dict as in the solver: 1.09x on the days of `spy` and `cl`,
+    0.98x on `reference` and 1.1x on a synthetic chain of 1M options.
+    """
+    data = load(file_path)
+    cases = dict()
+    cases['bundled days'] = [
+        _seed_inputs(*[np.asarray(data[day][key], dtype=float) for key in FEED_KEYS]) for day in data
+    ]
+    args, _ = synthetic_chain(synthetic_size)
+    cases['synthetic {}'.format(synthetic_size)] = [_seed_inputs(*[args[key] for key in FEED_KEYS])]
+
+    for case, inputs in cases.items():
+        work = dict()
+        elapsed = dict()
+        for name, fcn in [('full grid', _seed_full_grid), ('partitioned', lambda x, c: _seed(x, c, work))]:
+            best = np.inf
+            for _step in range(steps):
+                t_zero = time()
+                for x, c in inputs:
+                    fcn(x, c)
+                best = min(best, time() - t_zero)
+            elapsed[name] = best
+            print('{}, {}: {} ms per step'.format(case, name, np.round(best * 1000, 3)))
+
+        for k, (x, c) in enumerate(inputs):
+            # the same bits up to a reassociation of the floating point operations
+            if not np.allclose(_seed_full_grid(x, c), _seed(x, c), rtol=1e-14, atol=0):
+                print('{}: seeds differ on chain {}'.format(case, k))
+        print('{}: seed stage speedup {}x'.format(case, np.round(elapsed['full grid'] / elapsed['partitioned'], 2)))
+
+
+def compare_engines(file_path, steps=1, engines=('numpy', 'jaeckel')):
+    """cross-checks the engines against the first one and compares their throughput"""
+    data = load(file_path)
+    inputs = [[np.asarray(data[day][key], dtype=float) for key in FEED_KEYS] for day in data]
+    n = np.sum([np.size(args[1]) for args in inputs])
+
+    results = dict()
+    for engine in engines:
+        best = np.inf
+        for _step in range(steps):
+            t_zero = time()
+            sigma = [calcbsimpvol_flat(*args, engine=engine) for args in inputs]
+            best = min(best, time() - t_zero)
+        results[engine] = np.concatenate(sigma)
+        print('{}: {} options per second'.format(engine, np.round(n / best)))
+
+    reference = results[engines[0]]
+    for engine in engines[1:]:
+        both = ~np.isnan(reference) & ~np.isnan(results[engine])
+        print('{} vs {}: {} NaN differ, max. abs. difference {}'.format(
+            engine, engines[0],
+            np.sum(np.isnan(reference) != np.isnan(results[engine])),
+            np.max(np.abs(reference[both] - results[engine][both]))
+        ))
+    return results
+
+
 def main(file_path, steps):
     results = calc(file_path=file_path, steps=steps, do_return=True)
-    reference_data = json.loads(load_data(file_path))
+    reference_data = load(file_path)
 
     # 'reference' sample has only one single day (complete surface)
     # but 'cl' and 'spy' have multiple days for a single expiry
@@ -178,15 +244,32 @@ if __name__ == '__main__':
         default=100,
         type=int
     )
+    parser.add_option(
+        '-b', '--bench-seed',
+        action='store_true', dest='bench_seed',
+        help='benchmark the seeding stage only',
+        default=False
+    )
+    parser.add_option(
+        '-e', '--compare-engines',
+        action='store_true', dest='compare_engines',
+        help='cross-check the `jaeckel` engine against `numpy` and compare their throughput',
+        default=False
+    )
     p, args = parser.parse_args()
     if p.mode == 'reference':
-        file_path = os.path.join('..', 'data', 'reference_sample.json.zip')
+        file_path = data_path('reference_sample')
     # these have reference data, however the data is not from a third party
     elif p.mode == 'spy':
-        file_path = os.path.join('..', 'data', 'spy_20190118.json.zip')
+        file_path = data_path('spy_20190118')
     elif p.mode == 'cl':
-        file_path = os.path.join('..', 'data', 'cl_20171115.json.zip')
+        file_path = data_path('cl_20171115')
     else:
         raise ValueError('must be run with an argument (`reference`, `spy`, `cl`)')
 
-    main(file_path=file_path, steps=p.steps)
+    if p.bench_seed:
+        bench_seed(file_path=file_path, steps=p.steps)
+    elif p.compare_engines:
+        compare_engines(file_path=file_path, steps=p.steps)
+    else:
+        main(file_path=file_path, steps=p.steps)
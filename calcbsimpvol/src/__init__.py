@@ -1,7 +1,24 @@
+import sys
+
 from .calcbsimpvol import (
     calcbsimpvol,
-    _core,
+    calcbsimpvol_flat,
+    calcbsimpvol_black76,
+    _householder,
     _fcnv,
     _fcnN,
-    _fcnn
+    _fcnn,
+    CONVERGED,
+    BELOW_INTRINSIC,
+    ABOVE_UPPER_BOUND,
+    OUTSIDE_DOMAIN,
+    NOT_CONVERGED,
+    REASONS
 )
+from .solver import ImpliedVolSolver
+from .profiling import Profile
+from .stream import solve_stream
+from .cache import ResultCache
+if sys.version_info >= (3, 5):
+    # `async def` is a syntax error before Python 3.5
+    from .async_solver import AsyncImpliedVolSolver
@@ -0,0 +1,148 @@
+"""
+asyncio front end for many small concurrent requests
+
+A single solve of a few options is dominated by the fixed overhead of the vectorised solver.
+`AsyncImpliedVolSolver` collects the requests which arrive within a short time window, solves
+them in one vectorised call in an executor, so that the event loop is not blocked, and hands
+the implied volatilities back to the awaiting callers.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import local
+
+from numpy import cumsum, empty, float64, size, split
+
+from ..data import FEED_KEYS
+from .calcbsimpvol import _solve, _result_dtype
+from .profiling import _active, _attached
+from .stream import _flat_batch, _merge
+
+
+class AsyncImpliedVolSolver(object):
+    """
+    micro-batching solver for asyncio services
+
+    Args:
+        window (float): seconds a request waits for others to be solved with, 1 ms by default
+        max_batch (int): number of options which triggers a solve before the window has passed
+        executor (Executor): runs the solves, a single thread of its own by default
+        engine, seed, dtype, refine, tol, max_iter, cache: see `calcbsimpvol_flat`
+
+    Examples:
+
+    .. code-block:: python
+
+        from calcbsimpvol import AsyncImpliedVolSolver
+        solver = AsyncImpliedVolSolver(window=0.001)
+
+        async def handle(request):
+            sigma = await solver.implied_vol(cp=1, P=request.P, S=request.S, K=request.K, tau=request.tau, r=0.01, q=0.)
+            ...
+
+    """
+
+    def __init__(self, window=0.001, max_batch=2 ** 14, executor=None, engine='numpy', seed='rational',
+                 dtype=float64, refine=False, tol=1e-12, max_iter=10, cache=None):
+        if window < 0 or max_batch < 1:
+            raise ValueError('window must not be negative and max_batch must be positive')
+        self.window = window
+        self.max_batch = max_batch
+        self._own_executor = executor is None
+        self.executor = ThreadPoolExecutor(max_workers=1) if executor is None else executor
+        self.engine = engine
+        self.seed = seed
+        self.dtype = dtype
+        self.refine = refine
+        self.result_dtype = _result_dtype(dtype, refine)
+        self.tol = tol
+        self.max_iter = max_iter
+        self.cache = cache
+        # requests of the current window, [(batch, future)]
+        self._pending = []
+        self._n_pending = 0
+        self._timer = None
+        self._tasks = set()
+        # work buffers of the solver, one dict per thread of the executor
+        self._buffers = local()
+
+    async def implied_vol(self, cp, P, S, K, tau, r, q):
+        """
+        Args:
+            cp, P, S, K, tau, r, q: 1-D arrays of the same length or scalars, see `calcbsimpvol_flat`
+
+        Returns:
+            - **iv** (ndarray) – float...The Implied Volatility...[n]
+
+        """
+        batch = _flat_batch(dict(cp=cp, P=P, S=S, K=K, tau=tau, r=r, q=q))
+        n = size(batch['P'])
+        if not n:
+            # nothing to solve, an empty request does not join a batch
+            return empty(0, dtype=self.result_dtype)
+        loop = asyncio.get_event_loop()
+        # `loop.create_future` needs Python 3.5.2
+        future = asyncio.Future(loop=loop)
+        self._pending.append((batch, future))
+        self._n_pending += n
+        if self._n_pending >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        """ solves the requests of the current window """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending = self._pending
+        self._pending = []
+        self._n_pending = 0
+        if pending:
+            task = asyncio.ensure_future(self._solve_batch(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _solve_batch(self, pending):
+        batches = [batch for batch, _ in pending]
+        futures = [future for _, future in pending]
+        try:
+            # the solve is recorded into the profiles active in the thread of the event loop
+            sigma = await asyncio.get_event_loop().run_in_executor(
+                self.executor, partial(self._solve, _merge(batches), _active())
+            )
+        except Exception as error:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        sizes = [size(batch['P']) for batch in batches]
+        for future, result in zip(futures, split(sigma, cumsum(sizes)[:-1])):
+            # the caller may have been cancelled in the meantime
+            if not future.done():
+                future.set_result(result)
+
+    def _solve(self, batch, profiles):
+        work = getattr(self._buffers, 'work', None)
+        if work is None:
+            work = self._buffers.work = dict()
+        with _attached(profiles):
+            return _solve(
+                *[batch[key] for key in FEED_KEYS], engine=self.engine, work=work, seed=self.seed, dtype=self.dtype,
+                refine=self.refine, tol=self.tol, max_iter=self.max_iter, cache=self.cache
+            )
+
+    async def close(self):
+        """ solves the pending requests and shuts down the executor of its own """
+        self._flush()
+        if self._tasks:
+            await asyncio.wait(list(self._tasks))
+        if self._own_executor:
+            self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
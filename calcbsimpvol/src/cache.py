@@ -0,0 +1,247 @@
+"""
+Memoisation of implied volatilities across snapshots
+
+Many quotes of a feed repeat from one snapshot to the next, e.g. far wings which did not tick.
+A `ResultCache` passed as `cache` to `calcbsimpvol`, `calcbsimpvol_flat`, `calcbsimpvol_black76`,
+`solve_stream` or `AsyncImpliedVolSolver` answers these from memory and sends only the other options
+to the solver.
+
+The inputs (cp, P, S, K, tau, r, q), or (cp, P, F, K, tau, DF) of Black-76, of an option are
+quantised to `digits` significant decimal digits and hashed into a 64 bit key, column by column
+for all options at once. The keys of the cached options are kept sorted, so a batch is looked up
+with a single `searchsorted`. A hit is verified against the stored quantised inputs, so colliding
+keys are treated as misses.
+Once `max_size` options are cached, the least recently used ones are evicted.
+"""
+from math import ceil, log2
+from threading import Lock
+
+from numpy import (
+    asarray,
+    empty,
+    zeros,
+    ones,
+    full,
+    arange,
+    uint64,
+    int64,
+    intp,
+    float64,
+    size,
+    flatnonzero,
+    logical_not,
+    logical_and,
+    equal,
+    not_equal,
+    bitwise_and,
+    bitwise_xor,
+    right_shift,
+    add,
+    multiply,
+    minimum,
+    searchsorted,
+    argsort,
+    sort,
+    argpartition,
+    delete,
+    insert,
+    errstate,
+)
+
+from .calcbsimpvol import _size
+from .profiling import _start, _stop
+
+# multipliers of the hash (splitmix64 / golden ratio)
+_GOLDEN = uint64(0x9e3779b97f4a7c15)
+_MIX = uint64(0xbf58476d1ce4e5b9)
+_SHIFT = uint64(31)
+
+
+class ResultCache(object):
+    """
+    LRU cache of implied volatilities keyed on the quantised inputs of each option
+
+    A cache holds the results of one solver configuration, use separate caches for different
+    engines, tolerances or dtypes, and for Black-76 and spot based options. It is thread-safe and takes
+    8 bytes per input and 40 bytes for the hash, result, last use, sorted hash and slot of each cached
+    option, i.e. 96 bytes (88 bytes for Black-76).
+
+    Args:
+        max_size (int): maximum number of cached options, the least recently used ones are evicted
+        digits (int): significant decimal digits the inputs are rounded to, up to 16 (exact), inputs which
+            round to the same values share the cached implied volatility
+
+    Attributes:
+        hits (int): number of options answered from the cache
+        misses (int): number of options sent to the solver
+        evictions (int): number of options evicted
+
+    Examples:
+
+    .. code-block:: python
+
+        from calcbsimpvol import calcbsimpvol_flat, ResultCache
+        cache = ResultCache(max_size=2 ** 18)
+        for snapshot in feed:
+            sigma = calcbsimpvol_flat(**dict(snapshot, cache=cache))
+        cache.hits / (cache.hits + cache.misses)
+
+    """
+
+    def __init__(self, max_size=2 ** 16, digits=12):
+        if max_size < 1:
+            raise ValueError('max_size must be positive')
+        if not 1 <= digits <= 16:
+            raise ValueError('digits must be within 1 and 16')
+        self.max_size = int(max_size)
+        self.digits = digits
+        # the low bits of the 52 bit mantissa are rounded away
+        dropped = max(52 - int(ceil(digits * log2(10))), 0)
+        self._mask = uint64(~((1 << dropped) - 1) & 0xffffffffffffffff)
+        self._half = uint64((1 << dropped) >> 1)
+        self._lock = Lock()
+        self.clear()
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        """ removes all options and resets the counters """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self._size = 0
+            self._clock = 0
+            # quantised inputs, allocated by the first solve for its number of inputs,
+            # hash, result and last use of each slot
+            self._rows = None
+            self._hash = zeros(self.max_size, dtype=uint64)
+            self._sigma = empty(self.max_size)
+            self._used = zeros(self.max_size, dtype=int64)
+            # hashes of the cached options in ascending order and their slots
+            self._sorted = empty(0, dtype=uint64)
+            self._slots = empty(0, dtype=intp)
+
+    def _solve(self, solve, args, out=None, sigma0=None, dtype=float64):
+        """ answers the cached options, solves the others with `solve` and caches them
+        solve: callable, solves the flat `args` with the keywords `out` and `sigma0`
+        args: cp, P, S, K, tau, r, q or cp, P, F, K, tau, DF, flat ndarrays of size n or 1
+        out: [n x 1], the result is written into it
+        sigma0: [n x 1], initial guess of the misses
+        dtype: of the result
+
+        Returns:
+            sigma: [n x 1]
+
+        """
+        started = _start()
+        n = _size(args)
+        keys = [self._quantise(arg) for arg in args]
+        h = self._hash_keys(keys, n)
+        # the hashes are looked up in ascending order, which keeps `searchsorted` within the cache of the CPU
+        order = argsort(h)
+        with self._lock:
+            if self._rows is None:
+                self._rows = zeros((len(keys), self.max_size), dtype=uint64)
+            elif len(self._rows) != len(keys):
+                raise ValueError('the cache holds options of {} inputs, got {}, use separate caches for '
+                                 'calcbsimpvol_black76 and the spot based functions'.format(len(self._rows), len(keys)))
+            slot, hit = self._lookup(keys, h, order)
+            found = flatnonzero(hit)
+            self._clock += 1
+            self._used[slot[found]] = self._clock
+            self.hits += found.size
+            self.misses += n - found.size
+            sigma = empty(n, dtype=dtype) if out is None else out
+            sigma[found] = self._sigma[slot[found]]
+        _stop('cache', started, n, hits=found.size)
+        if found.size == n:
+            return sigma
+        if found.size == 0:
+            solve(*args, out=sigma, sigma0=sigma0)
+        else:
+            missed = flatnonzero(logical_not(hit))
+            sigma[missed] = solve(
+                *[arg if size(arg) == 1 else arg[missed] for arg in args],
+                sigma0=None if sigma0 is None or size(sigma0) == 1 else sigma0[missed]
+            )
+            order = order[logical_not(hit[order])]
+
+        started = _start()
+        with self._lock:
+            self._insert(keys, h, sigma, order)
+        _stop('cache', started, n - found.size)
+        return sigma
+
+    def _quantise(self, arg):
+        """ bit pattern of the float64 values rounded to `digits` significant digits """
+        bits = asarray(arg, dtype=float64).reshape(-1).view(uint64)
+        return bitwise_and(add(bits, self._half), self._mask)
+
+    def _hash_keys(self, keys, n):
+        """ 64 bit hash of the quantised inputs of each option """
+        h = full(n, _GOLDEN, dtype=uint64)
+        tmp = empty(n, dtype=uint64)
+        with errstate(over='ignore'):
+            for key in keys:
+                bitwise_xor(h, key, out=h)
+                multiply(h, _MIX, out=h)
+                right_shift(h, _SHIFT, out=tmp)
+                bitwise_xor(h, tmp, out=h)
+        return h
+
+    def _lookup(self, keys, h, order):
+        """ slot of each option and whether it is cached, `order` sorts `h` """
+        n = h.size
+        slot = zeros(n, dtype=intp)
+        hit = zeros(n, dtype=bool)
+        if not self._size:
+            return slot, hit
+        h_sorted = h[order]
+        position = minimum(searchsorted(self._sorted, h_sorted), self._size - 1)
+        slot[order] = self._slots[position]
+        hit[order] = equal(self._sorted[position], h_sorted)
+        # colliding hashes of different inputs are misses
+        for key, row in zip(keys, self._rows):
+            logical_and(hit, equal(row[slot], key), out=hit)
+        return slot, hit
+
+    def _insert(self, keys, h, sigma, index):
+        """ caches the options `index`, given in ascending order of their hash, evicts the least recently used ones """
+        h = h[index]
+        # one option per hash, hashes which are cached already (collisions or other threads) are skipped
+        new = ones(h.size, dtype=bool)
+        not_equal(h[1:], h[:-1], out=new[1:])
+        if self._size:
+            position = minimum(searchsorted(self._sorted, h), self._size - 1)
+            logical_and(new, not_equal(self._sorted[position], h), out=new)
+        new = flatnonzero(new)
+        if new.size > self.max_size:
+            # a batch larger than the cache keeps `max_size` of its options
+            new = new[:self.max_size]
+        h, index = h[new], index[new]
+        m = h.size
+        if not m:
+            return
+
+        free = min(self.max_size - self._size, m)
+        slot = empty(m, dtype=intp)
+        slot[:free] = arange(self._size, self._size + free)
+        sorted_h, slots = self._sorted, self._slots
+        if free < m:
+            evicted = argpartition(self._used[:self._size], m - free - 1)[:m - free]
+            slot[free:] = evicted
+            drop = searchsorted(sorted_h, sort(self._hash[evicted]))
+            sorted_h, slots = delete(sorted_h, drop), delete(slots, drop)
+            self.evictions += evicted.size
+        self._size += free
+
+        for key, row in zip(keys, self._rows):
+            row[slot] = key if key.size == 1 else key[index]
+        self._hash[slot] = h
+        self._sigma[slot] = sigma[index]
+        self._used[slot] = self._clock
+        position = searchsorted(sorted_h, h)
+        self._sorted = insert(sorted_h, position, h)
+        self._slots = insert(slots, position, slot)
@@ -1,55 +1,167 @@
+from functools import partial
+
 from scipy.special import erf
 # it is common to use `import numpy as np`
 # but what don't you do to save 3 characters ...
 from numpy import (
     # --- logical
-    any,
     bitwise_not,
     logical_and,
+    logical_not,
+    logical_or,
+    isnan,
+    isfinite,
 
     # --- constants / data type
     nan,
     pi,
-    ndarray,
+    float64,
+    float32,
+    dtype as numpy_dtype,
+    intp,
+    int8,
 
     # --- creation
     asarray,
+    empty,
     zeros,
-    ones,
     full,
+    arange,
 
     # --- ops
     absolute,
     shape,
     size,
     maximum,
+    where,
     log,
     exp,
     sqrt,
-    sum,
+    add,
+    subtract,
+    multiply,
+    divide,
+    negative,
+    equal,
+    greater,
+    greater_equal,
+    less,
+    less_equal,
+    not_equal,
+    count_nonzero,
+    cumsum,
 
     # --- juggling
-    reshape
+    put,
+    place,
+    copyto,
+    may_share_memory,
+    reshape,
+    ravel,
+    broadcast_to,
+    errstate
+)
+
+from ..data import FEED_KEYS
+from .profiling import _start, _stop, _allocated
+
+
+# an initial guess sigma0 is used if SIGMA0_BOUNDS[0] < sigma0 < SIGMA0_BOUNDS[1]
+SIGMA0_BOUNDS = (0., 10.)
+# relative price tolerance of the single precision iterations, see `_solve_single`
+SINGLE_RTOL = 1e-5
+# normalised prices below SINGLE_C_MIN are solved in float64, float32 does not resolve them
+SINGLE_C_MIN = 1e-6
+
+# reason codes of `diagnostics=True`, `REASONS[code]` describes a code
+CONVERGED = 0
+BELOW_INTRINSIC = 1
+ABOVE_UPPER_BOUND = 2
+OUTSIDE_DOMAIN = 3
+NOT_CONVERGED = 4
+REASONS = (
+    'converged',
+    'at or below the intrinsic value',
+    'at or above the upper bound, DF * F for calls and DF * K for puts',
+    'outside of the domain, e.g. NaN inputs or tau <= 0',
+    'not converged within max_iter iterations',
+)
+
+# coefficients of Eq. (19), Li (2006)
+_P = (-0.969271876255, 0.097428338274, 1.750081126685)
+# below this many options `_seed` evaluates both domains on every option, the compaction of
+# each domain only pays off on larger chains
+_SEED_PARTITION = 4096
+
+# the 14 coefficients of the numerator (n) and denominator (m) of Eq. (19)
+# arranged by the power of x (rows) and the power of sqrt(c) (columns)
+_N = (
+    (0., -0.068098378725, -0.263473754689, 4.714393825758, 14.749084301452),
+    (0.440639436211, -5.792537721792, 3.529944137559, -32.570660102526),
+    (-5.267481008429, -23.636495876611, 76.398155779133),
+    (-9.020361771283, 41.855161781749),
+    (-12.150611865704,),
+)
+
+_M = (
+    (0., 6.268456292246, 30.068281276567, -11.473184324152, -13.954993561151),
+    (-6.284840445036, -11.780036995036, -230.101682610568, 261.950288864225),
+    (-2.310966989723, 86.127219899668, 20.090690444187),
+    (3.730181294225, -50.117067019539),
+    (13.723711519422,),
 )
 
 
-def calcbsimpvol(arg_dict):
+def calcbsimpvol(arg_dict, engine='numpy', workers=1, out=None, sigma0=None, return_greeks=False, seed='rational',
+                 dtype=float64, refine=False, tol=1e-12, max_iter=10, diagnostics=False, chunk_size=None, cache=None):
     """
     calculates implied volatility surface or smile. Translated from MATLAB code.
     As it is a bare-metal package I would suggest to write an adapter class to feed the function.
 
+    Neither `arg_dict` nor the arrays in it are modified. Puts are converted into call prices
+    within an internal buffer, so shared, read-only or memory-mapped arrays can be passed
+    without copying them first.
+
     Args:
         arg_dict(dict):
         cp  (ndarray):  int.....Call = [+1], Put = [-1]...[m x n] or [1 x 1]
         P   (ndarray):  float...Option Price Matrix...[m x n]
-        S   (ndarray):  float...Underlying Price...[1 x 1]
+        S   (ndarray):  float...Underlying Price...[m x n] or [1 x 1]
         K   (ndarray):  float...Strike Price...[m x n]
         tau (ndarray):  float...Time to Expiry in Years...[m x n]
         r   (ndarray):  float...Continuous Risk-Free Rate...[m x n] or [1 x 1]
         q   (ndarray):  float...Continuous Dividend Yield...[m x n] or [1 x 1]
+        engine (str): 'numpy' (default), 'numba' (requires the optional `numba` dependency)
+            or 'jaeckel' ("Let's Be Rational", machine precision in two iterations, ignores `sigma0`)
+        workers (int): number of threads solving chunks of options concurrently,
+            `None` uses all CPUs, default is 1 (serial)
+        out (ndarray): float...C-contiguous array the result is written into...[m x n]
+        sigma0 (ndarray): float...initial guess, i.e. the implied volatility of the previous snapshot...[m x n]
+            NaN or out of range (0, 10) entries fall back to the rational initial guess
+        return_greeks (bool): return a dict of the implied volatility and its Greeks instead
+        seed (str): initial guess, 'rational' (default, Li 2006) or 'table' (interpolated in
+            a table which is computed once per process, see `calcbsimpvol.src.table`)
+        dtype: float64 (default) or float32, precision of the seeding stage and the iterations (numpy engine),
+            float32 halves the memory traffic and converges to a relative price tolerance of 1e-5
+        refine (bool): refine a float32 solution with float64 iterations to the full tolerance
+        tol (float): tolerance of the root-finder on the option price, |P - price(sigma)| <= tol, 1e-12 by default
+        max_iter (int): maximum number of Householder iterations, 10 by default, options which
+            did not converge by then are NaN
+        diagnostics (bool): return a dict of the implied volatility and per-option diagnostics instead,
+            see Returns
+        chunk_size (int): solve chunks of `chunk_size` options one after the other (or concurrently, see `workers`),
+            which bounds the memory of the solver, e.g. to write into a memory-mapped `out`
+        cache (ResultCache): answers options whose inputs were solved before from memory and solves only
+            the others, see `calcbsimpvol.src.cache`, not available with `diagnostics`
 
     Returns:
-        - **iv** (ndarray) – float...The Implied Volatility...[m x n]
+        - **iv** (ndarray) – float...The Implied Volatility...[m x n], float32 for `dtype=float32` without `refine`
+        - or with `return_greeks=True` a dict of [m x n] ndarrays with the keys
+          `iv`, `delta`, `gamma`, `vega`, `theta`, `rho`, `vanna`, `volga`, see `_greeks`
+        - with `diagnostics=True` the dict holds (also) `iterations`, the number of iterations of each option,
+          `residual`, P - price(sigma) at the returned (or last) volatility, and `reason`,
+          the reason code `CONVERGED`, `BELOW_INTRINSIC`, `ABOVE_UPPER_BOUND`, `OUTSIDE_DOMAIN` or
+          `NOT_CONVERGED` of each option, see `REASONS`
 
     Examples:
         This is the first example which is also included separate file within
@@ -149,207 +261,1053 @@ def calcbsimpvol(arg_dict):
         4)  https://www.mathworks.com/matlabcentral/fileexchange/41473-calcbsimpvol-cp-p-s-k-t-r-q
 
     """
+    started = _start()
     # rather have a dict or class instead of seven variables
-    feed_keys = ['cp', 'P', 'S', 'K', 'tau', 'r', 'q']
-    for key in feed_keys:
-        if type(arg_dict[key]) is not ndarray:
-            arg_dict[key] = asarray(arg_dict[key])
+    # the entries of `arg_dict` are converted into local views, neither the dict nor the arrays are modified
+    args = dict()
+    for key in FEED_KEYS:
+        args[key] = asarray(arg_dict[key])
         # convert to column vector
-        if len(shape(arg_dict[key])) == 1 and key is not 'S':
-            arg_dict[key] = reshape(arg_dict[key], (size(arg_dict[key]), 1))
-
-    # create short pointers/variables for data inside arg_dict
-    cp = arg_dict['cp']
-    P = arg_dict['P']
-    S = arg_dict['S']
-    K = arg_dict['K']
-    tau = arg_dict['tau']
-    r = arg_dict['r']
-    q = arg_dict['q']
-
-    gh = shape(P)
+        if len(shape(args[key])) == 1:
+            args[key] = reshape(args[key], (size(args[key]), 1))
+
+    # scalars are kept as they are, everything else is broadcast against the shape of P
+    gh = shape(args['P'])
     g = gh[0]
     h = gh[1]
+    flat_args = [_flatten(args[key], gh) for key in FEED_KEYS]
+    if sigma0 is not None:
+        sigma0 = _flatten(asarray(sigma0), gh)
+    _stop('coercion', started, g * h)
+    diagnosed = _diagnostics(g * h) if diagnostics else dict()
+    sigma = _solve(
+        *flat_args,
+        engine=engine, workers=workers, out=_flat_out(out, g * h, _result_dtype(dtype, refine)),
+        sigma0=sigma0, seed=seed, dtype=dtype, refine=refine, tol=tol, max_iter=max_iter, chunk_size=chunk_size,
+        cache=cache, **diagnosed
+    )
+    if return_greeks or diagnostics:
+        result = dict()
+        if return_greeks:
+            started = _start()
+            cp, P, S, K, tau, r, q = flat_args
+            result.update(_greeks(cp, S, K, tau, r, q, sigma))
+            _stop('greeks', started, g * h)
+        result.update(diagnosed)
+        result = {key: reshape(broadcast_to(value, (g * h,)), (g, h)) for key, value in result.items()}
+        result['iv'] = reshape(sigma, (g, h)) if out is None else out
+        return result
+    if out is not None:
+        return out
+    sigma = reshape(sigma, (g, h))
+    return sigma
 
-    # for simplicity reasons a risk free rate and or dividend yield can be
-    # supplied as a scalar value or previously modeled and supplied as an array / vector
-    if size(r) == 1:
-        r = r * ones((g, h))
-    if size(q) == 1:
-        q = q * ones((g, h))
-    if size(cp) == 1:
-        cp = cp * ones((g, h))
-
-    p = asarray([-0.969271876255, 0.097428338274, 1.750081126685])
-    m_values = [
-        6.268456292246,
-        -6.284840445036,
-        30.068281276567,
-        -11.780036995036,
-        -2.310966989723,
-        -11.473184324152,
-        -230.101682610568,
-        86.127219899668,
-        3.730181294225,
-        -13.954993561151,
-        261.950288864225,
-        20.090690444187,
-        -50.117067019539,
-        13.723711519422
-    ]
-
-    m = ones((g, h, 14))
-    for zetta in range(14):
-        m[:, :, zetta] = ones((g, h)) * m_values[zetta]
-
-    n_values = [
-        -0.068098378725,
-        0.440639436211,
-        -0.263473754689,
-        -5.792537721792,
-        -5.267481008429,
-        4.714393825758,
-        3.529944137559,
-        -23.636495876611,
-        -9.020361771283,
-        14.749084301452,
-        -32.570660102526,
-        76.398155779133,
-        41.855161781749,
-        -12.150611865704
-    ]
-
-    n = ones((g, h, 14))
-    for zetta in range(14):
-        n[:, :, zetta] = ones((g, h)) * n_values[zetta]
-
-    i_values = [0, 1, 0, 1, 2, 0, 1, 2, 3, 0, 1, 2, 3, 4]
-    i = ones((g, h, 14))
-    for zetta in range(14):
-        i[:, :, zetta] = ones((g, h)) * i_values[zetta]
-
-    j_values = [1, 0, 2, 1, 0, 3, 2, 1, 0, 4, 3, 2, 1, 0]
-    j = ones((g, h, 14))
-    for zetta in range(14):
-        j[:, :, zetta] = ones((g, h)) * j_values[zetta]
-
-    P[cp == -1] = P[cp == -1] + S * exp(-q[cp == -1] * tau[cp == -1]) - K[cp == -1] * exp(-r[cp == -1] * tau[cp == -1])
-    P = maximum(P, 0)
-
-    c_values = P / (S * exp(-q * tau))
-    x_values = log(S * exp((r - q) * tau) / K)
-
-    c = ones((shape(c_values)[0], shape(c_values)[1], 14))
-    x = ones((shape(x_values)[0], shape(x_values)[1], 14))
-
-    for zetta in range(shape(x)[2]):
-        x[:, :, zetta] = x_values
-        c[:, :, zetta] = c_values
-
-    v1_fixed = _fcnv(p, m, n, i, j, x, maximum(c, 0))  # D- Domain (x < 1)
-    v2_fixed = _fcnv(p, m, n, i, j, -x, maximum(exp(x) * c + 1 - exp(x), 0))  # D+ Domain (x > 1)
-
-    v = zeros((g, h))
-    v[x[:, :, 0] <= 0] = v1_fixed[x[:, :, 0] <= 0]
-    v[x[:, :, 0] > 0] = v2_fixed[x[:, :, 0] > 0]
 
-    # Domain-of-Approximation is x = {-0.5, +0.5}, v = {0, 1}, x/v = {-2, 2}
-    domain_filter = logical_and(
-        logical_and(logical_and(x[:, :, 0] >= -0.5, x[:, :, 0] <= 0.5), logical_and(v > 0, v < 1)),
-        logical_and((x[:, :, 0] / v) <= 2, (x[:, :, 0] / v) >= -2))
+def calcbsimpvol_flat(cp, P, S, K, tau, r, q, engine='numpy', workers=1, out=None, sigma0=None, return_greeks=False,
+                      seed='rational', dtype=float64, refine=False, tol=1e-12, max_iter=10, diagnostics=False,
+                      chunk_size=None, cache=None):
+    """
+    calculates implied volatilities of a flat / ragged option chain. Each argument is either
+    a 1-D array of length n or a scalar. Scalars are broadcast without being copied, so there
+    is no need to pad a ragged chain (i.e. each expiry with its own set of strikes) into a matrix.
 
-    not_domain = bitwise_not(domain_filter)
-    v[not_domain] = 0.8
-    sigma = v / sqrt(tau)
+    Args:
+        cp  (ndarray):  int.....Call = [+1], Put = [-1]...[n] or scalar
+        P   (ndarray):  float...Option Price...[n]
+        S   (ndarray):  float...Underlying Price...[n] or scalar
+        K   (ndarray):  float...Strike Price...[n] or scalar
+        tau (ndarray):  float...Time to Expiry in Years...[n] or scalar
+        r   (ndarray):  float...Continuous Risk-Free Rate...[n] or scalar
+        q   (ndarray):  float...Continuous Dividend Yield...[n] or scalar
+        engine (str): 'numpy' (default), 'numba' (requires the optional `numba` dependency)
+            or 'jaeckel' ("Let's Be Rational", machine precision in two iterations, ignores `sigma0`)
+        workers (int): number of threads solving chunks of options concurrently,
+            `None` uses all CPUs, default is 1 (serial)
+        out (ndarray): float...array the result is written into...[n]
+        sigma0 (ndarray): float...initial guess, i.e. the implied volatility of the previous snapshot...[n]
+            NaN or out of range (0, 10) entries fall back to the rational initial guess
+        return_greeks (bool): return a dict of the implied volatility and its Greeks instead
+        seed (str): initial guess, 'rational' (default, Li 2006) or 'table' (interpolated in
+            a table which is computed once per process, see `calcbsimpvol.src.table`)
+        dtype: float64 (default) or float32, precision of the seeding stage and the iterations (numpy engine),
+            float32 halves the memory traffic and converges to a relative price tolerance of 1e-5
+        refine (bool): refine a float32 solution with float64 iterations to the full tolerance
+        tol (float): tolerance of the root-finder on the option price, |P - price(sigma)| <= tol, 1e-12 by default
+        max_iter (int): maximum number of Householder iterations, 10 by default, options which
+            did not converge by then are NaN
+        diagnostics (bool): return a dict of the implied volatility and per-option diagnostics instead,
+            see Returns
+        chunk_size (int): number of options solved at a time, see `calcbsimpvol`
+        cache (ResultCache): memoises the implied volatilities across calls, see `calcbsimpvol`
 
-    # Householder's root-finder
-    k_max = 10
-    tolerance = asarray(1e-12)
+    Returns:
+        - **iv** (ndarray) – float...The Implied Volatility...[n]
+        - or with `return_greeks=True` a dict of [n] ndarrays with the keys
+          `iv`, `delta`, `gamma`, `vega`, `theta`, `rho`, `vanna`, `volga`, see `_greeks`
+        - with `diagnostics=True` the dict holds (also) `iterations`, `residual` and `reason`, see `calcbsimpvol`
 
-    sigma = sigma.flatten()
-    P = P.flatten()
-    S = S.flatten()
-    K = K.flatten()
-    tau = tau.flatten()
-    r = r.flatten()
-    q = q.flatten()
+    Examples:
 
-    C = full((shape(P)), True, dtype=bool)
-    s = _core(P, S, K, tau, r, q, sigma, C)
+    .. code-block:: python
 
-    e = s['obj']
-    C = absolute(e) > tolerance
-    k = 1
+        from calcbsimpvol import calcbsimpvol_flat
+        import numpy as np
+        K = np.asarray([90., 100., 110., 95., 100., 105., 120.])
+        tau = np.asarray([0.25, 0.25, 0.25, 1., 1., 1., 1.])
+        P = np.asarray([11.72, 4.62, 1.13, 12.89, 8.91, 6.89, 3.16])
+        sigma = calcbsimpvol_flat(cp=1, P=P, S=100, K=K, tau=tau, r=0.01, q=0.02)
+        print(sigma)
+        # [0.29475173, 0.23883862, 0.21667633, 0.28264772, 0.23961097, 0.23807147, 0.24216247]
 
-    while logical_and(any(C), k <= k_max):
+    """
+    started = _start()
+    args = [ravel(asarray(arg)) for arg in (cp, P, S, K, tau, r, q)]
+    n = _size(args)
+    if sigma0 is not None:
+        sigma0 = ravel(asarray(sigma0))
+    _stop('coercion', started, n)
+    diagnosed = _diagnostics(n) if diagnostics else dict()
+    sigma = _solve(
+        *args, engine=engine, workers=workers, out=_flat_out(out, n, _result_dtype(dtype, refine)),
+        sigma0=sigma0, seed=seed, dtype=dtype, refine=refine, tol=tol, max_iter=max_iter, chunk_size=chunk_size,
+        cache=cache, **diagnosed
+    )
+    if return_greeks or diagnostics:
+        result = dict(diagnosed)
+        if return_greeks:
+            started = _start()
+            cp, P, S, K, tau, r, q = args
+            result.update({key: broadcast_to(value, (n,)) for key, value in _greeks(cp, S, K, tau, r, q, sigma).items()})
+            _stop('greeks', started, n)
+        result['iv'] = sigma
+        return result
+    return sigma
 
-        s = _core(P, S, K, tau, r, q, sigma, C)
-        numerator = (6 * e[C] * s['vega'] ** 2 + 3 * e[C] ** 2 * s['vomma'])
-        denominator = (-6 * s['vega'] ** 3 - 6 * e[C] * s['vega'] * s['vomma'] - e[C] ** 2 * s['ultima'])
 
-        sigma[C] = sigma[C] - (numerator / denominator)
-        s = _core(P, S, K, tau, r, q, sigma, C)
-        e[C] = s['obj']
+def calcbsimpvol_black76(cp, P, F, K, tau, DF, engine='numpy', workers=1, out=None, sigma0=None, return_greeks=False,
+                         seed='rational', dtype=float64, refine=False, tol=1e-12, max_iter=10, diagnostics=False,
+                         chunk_size=None, cache=None):
+    """
+    calculates Black (1976) implied volatilities of options on futures or forwards, i.e. quoted
+    against a forward price `F` and a discount factor `DF` per option instead of a spot price,
+    a risk-free rate and a dividend yield. Arguments are broadcast like in `calcbsimpvol_flat`.
 
-        C = absolute(e) > tolerance
-        k = k + 1
+    Args:
+        cp  (ndarray):  int.....Call = [+1], Put = [-1]...[n] or scalar
+        P   (ndarray):  float...Option Price...[n]
+        F   (ndarray):  float...Forward / Futures Price...[n] or scalar
+        K   (ndarray):  float...Strike Price...[n] or scalar
+        tau (ndarray):  float...Time to Expiry in Years...[n] or scalar
+        DF  (ndarray):  float...Discount Factor to Expiry of the Option Premium...[n] or scalar
+        engine (str): 'numpy' (default), 'numba' (requires the optional `numba` dependency)
+            or 'jaeckel' ("Let's Be Rational", machine precision in two iterations, ignores `sigma0`)
+        workers (int): number of threads solving chunks of options concurrently,
+            `None` uses all CPUs, default is 1 (serial)
+        out (ndarray): float...array the result is written into...[n]
+        sigma0 (ndarray): float...initial guess, i.e. the implied volatility of the previous snapshot...[n]
+            NaN or out of range (0, 10) entries fall back to the rational initial guess
+        return_greeks (bool): return a dict of the implied volatility and its Greeks instead
+        seed (str): initial guess, 'rational' (default) or 'table', see `calcbsimpvol`
+        dtype: float64 (default) or float32, see `calcbsimpvol`
+        refine (bool): refine a float32 solution in float64, see `calcbsimpvol`
+        tol (float): tolerance on the option price, see `calcbsimpvol`
+        max_iter (int): maximum number of iterations, see `calcbsimpvol`
+        diagnostics (bool): return a dict of the implied volatility and per-option diagnostics, see `calcbsimpvol`
+        chunk_size (int): number of options solved at a time, see `calcbsimpvol`
+        cache (ResultCache): memoises the implied volatilities across calls, see `calcbsimpvol`,
+            a cache holds the options of either `calcbsimpvol_black76` or the spot based functions
 
-    sigma[C] = nan
-    sigma = reshape(sigma, (g, h))
-    return sigma
+    Returns:
+        - **iv** (ndarray) – float...The Implied Volatility...[n]
+        - or with `return_greeks=True` a dict of [n] ndarrays with the keys
+          `iv`, `delta`, `gamma`, `vega`, `theta`, `rho`, `vanna`, `volga`, see `_greeks_black76`
+        - with `diagnostics=True` the dict holds (also) `iterations`, `residual` and `reason`, see `calcbsimpvol`
 
+    Examples:
 
-def _core(P, S, K, tau, r, q, sigma, C):
-    """ calculation part, takes  ndarrays (column vector)
-    S: float, scalar
-    P,  K, tau, r, q, sig:  float, [n x 1]
-    C: boolean, [n x 1]
+    .. code-block:: python
+
+        from calcbsimpvol import calcbsimpvol_black76
+        import numpy as np
+        cp = np.asarray([1, 1, 1, -1, -1, -1])
+        K = np.asarray([60., 65., 70., 60., 65., 70.])
+        tau = np.asarray([0.25, 0.25, 0.25, 1., 1., 1.])
+        P = np.asarray([6.61, 3.58, 1.62, 4.12, 7.39, 10.92])
+        sigma = calcbsimpvol_black76(cp=cp, P=P, F=65., K=K, tau=tau, DF=np.exp(-0.03 * tau))
+        print(sigma)
+        # [0.29112403, 0.27841804, 0.26711295, 0.25910168, 0.29472666, 0.31787484]
 
     """
-    denominator = (sigma[C] * sqrt(tau[C]))
-    d1 = (log(S / K[C]) + (r[C] - q[C] + sigma[C] ** 2 * 0.5) * (tau[C])) / denominator
-    d2 = (log(S / K[C]) + (r[C] - q[C] - sigma[C] ** 2 * 0.5) * (tau[C])) / denominator
+    started = _start()
+    args = [ravel(asarray(arg)) for arg in (cp, P, F, K, tau, DF)]
+    n = _size(args)
+    if sigma0 is not None:
+        sigma0 = ravel(asarray(sigma0))
+    _stop('coercion', started, n)
+    diagnosed = _diagnostics(n) if diagnostics else dict()
+    sigma = _solve_black76(
+        *args, engine=engine, workers=workers, out=_flat_out(out, n, _result_dtype(dtype, refine)),
+        sigma0=sigma0, seed=seed, dtype=dtype, refine=refine, tol=tol, max_iter=max_iter, chunk_size=chunk_size,
+        cache=cache, **diagnosed
+    )
+    if return_greeks or diagnostics:
+        result = dict(diagnosed)
+        if return_greeks:
+            started = _start()
+            cp, P, F, K, tau, DF = args
+            greeks = _greeks_black76(cp, F, K, tau, DF, sigma)
+            result.update({key: broadcast_to(value, (n,)) for key, value in greeks.items()})
+            _stop('greeks', started, n)
+        result['iv'] = sigma
+        return result
+    return sigma
 
-    fcnN_d1 = _fcnN(d1)
-    fcnN_d2 = _fcnN(d2)
 
+def _greeks(cp, S, K, tau, r, q, sigma):
+    """ Greeks of the options at their implied volatility, takes flat ndarrays of size n or 1
+    Options without an implied volatility (NaN) have NaN Greeks.
+
+    Returns:
+        dict of float, [n x 1]:
+            delta, gamma: first and second derivative w.r.t. S
+            vega: derivative w.r.t. sigma (per 1.00 change of sigma)
+            theta: derivative w.r.t. the calendar time, i.e. -d/dtau (per year)
+            rho: derivative w.r.t. r
+            vanna: derivative of delta w.r.t. sigma
+            volga: second derivative w.r.t. sigma (vomma)
+
+    """
+    sqrt_tau = sqrt(tau)
+    sigma_sqrt_tau = sigma * sqrt_tau
+    d1 = (log(S / K) + (r - q) * tau) / sigma_sqrt_tau + 0.5 * sigma_sqrt_tau
+    d2 = d1 - sigma_sqrt_tau
+    q_df = exp(-q * tau)
+    K_df = K * exp(-r * tau)
+    # puts: sign = -1, calls: sign = +1
+    sign = where(cp == -1, -1., 1.)
+    fcnN_d1 = _fcnN(sign * d1)
+    fcnN_d2 = _fcnN(sign * d2)
     fcnn_d1 = _fcnn(d1)
-    fcnn_d2 = _fcnn(d2)
 
-    call = exp(-q[C] * tau[C]) * S * fcnN_d1 - exp(-r[C] * tau[C]) * K[C] * fcnN_d2
-    obj = (P[C] - call)
+    vega = S * q_df * fcnn_d1 * sqrt_tau
+    return {
+        'delta': sign * q_df * fcnN_d1,
+        'gamma': q_df * fcnn_d1 / (S * sigma_sqrt_tau),
+        'vega': vega,
+        'theta': (
+            -S * q_df * fcnn_d1 * sigma / (2 * sqrt_tau)
+            - sign * r * K_df * fcnN_d2
+            + sign * q * S * q_df * fcnN_d1
+        ),
+        'rho': sign * K_df * tau * fcnN_d2,
+        'vanna': -q_df * fcnn_d1 * d2 / sigma,
+        'volga': vega * d1 * d2 / sigma,
+    }
+
 
-    vega = S * exp(-q[C] * (tau[C])) * fcnn_d1 * (sqrt(tau[C]))
-    vomma = vega * d1 * d2 / sigma[C]
-    ultima = -1 * vega * (d1 * d2 * (1 - d1 * d2) + d1 ** 2 + d2 ** 2) / (sigma[C] ** 2)
+def _greeks_black76(cp, F, K, tau, DF, sigma):
+    """ Black-76 Greeks of the options at their implied volatility, takes flat ndarrays of size n or 1
+    The forward is held constant, i.e. the Greeks of options on futures. Options without an
+    implied volatility (NaN) have NaN Greeks.
 
+    Returns:
+        dict of float, [n x 1]:
+            delta, gamma: first and second derivative w.r.t. F
+            vega: derivative w.r.t. sigma (per 1.00 change of sigma)
+            theta: derivative w.r.t. the calendar time, i.e. -d/dtau (per year), at the continuous
+                rate r = -log(DF) / tau
+            rho: derivative w.r.t. r, i.e. -tau * price
+            vanna: derivative of delta w.r.t. sigma
+            volga: second derivative w.r.t. sigma (vomma)
+
+    """
+    sqrt_tau = sqrt(tau)
+    sigma_sqrt_tau = sigma * sqrt_tau
+    d1 = log(F / K) / sigma_sqrt_tau + 0.5 * sigma_sqrt_tau
+    d2 = d1 - sigma_sqrt_tau
+    # puts: sign = -1, calls: sign = +1
+    sign = where(cp == -1, -1., 1.)
+    fcnN_d1 = _fcnN(sign * d1)
+    fcnn_d1 = _fcnn(d1)
+    price = sign * DF * (F * fcnN_d1 - K * _fcnN(sign * d2))
+
+    vega = DF * F * fcnn_d1 * sqrt_tau
     return {
-        'd1': d1,
-        'd2': d2,
-        'fcnN_d1': fcnN_d1,
-        'fcnN_d2': fcnN_d2,
-        'fcnn_d1': fcnn_d1,
-        'fcnn_d2': fcnn_d2,
-        'call': call,
-        'obj': obj,
+        'delta': sign * DF * fcnN_d1,
+        'gamma': DF * fcnn_d1 / (F * sigma_sqrt_tau),
         'vega': vega,
-        'vomma': vomma,
-        'ultima': ultima
+        'theta': -DF * F * fcnn_d1 * sigma / (2 * sqrt_tau) - log(DF) / tau * price,
+        'rho': -tau * price,
+        'vanna': -DF * fcnn_d1 * d2 / sigma,
+        'volga': vega * d1 * d2 / sigma,
     }
 
 
-def _fcnv(p, m, n, i, j, x, c):
-    """  Eq. (19), Li (2006) """
-    return p[0] * x[:, :, 0] + p[1] * sqrt(c[:, :, 0]) + p[2] * c[:, :, 0] + (
-        sum(n * ((x ** i) * (sqrt(c) ** j)), 2)) / (1 + sum(m * ((x ** i) * (sqrt(c) ** j)), 2))
+def _flatten(arg, gh):
+    """ flattens `arg` to a column vector of the size of `gh`, scalars are left as [1 x 1] """
+    if size(arg) == 1:
+        return ravel(arg)
+    return ravel(broadcast_to(arg, gh))
+
+
+def _size(args):
+    """ number of options of flat ndarrays of size n or 1, i.e. the size of their broadcast, may be 0 """
+    # unlike `max(size)`, an empty chain stays empty with scalar arguments,
+    # `numpy.broadcast` would allocate an iterator buffer on every call
+    sizes = set(size(arg) for arg in args if size(arg) != 1)
+    if len(sizes) > 1:
+        raise ValueError('the arguments must be scalars or arrays of the same size, got sizes {}'.format(sorted(sizes)))
+    return sizes.pop() if sizes else 1
+
+
+def _flat_out(out, n, dtype=float64):
+    """ flat view on the output array `out`, the result is written into it """
+    if out is None:
+        return None
+    if size(out) != n or not out.flags.c_contiguous or out.dtype != dtype:
+        raise ValueError('out must be a C-contiguous {} array with {} elements'.format(numpy_dtype(dtype), n))
+    return reshape(out, (n,))
+
+
+def _result_dtype(dtype, refine):
+    """ dtype of the implied volatility, float32 only for single precision without refinement """
+    dtype = numpy_dtype(dtype)
+    if dtype not in (float64, float32):
+        raise ValueError('unknown dtype: {}, expected float64 or float32'.format(dtype))
+    return float64 if refine else dtype
+
+
+def _solve(cp, P, S, K, tau, r, q, engine='numpy', workers=1, work=None, out=None, sigma0=None, seed='rational',
+           dtype=float64, refine=False, tol=1e-12, max_iter=10, iterations=None, residual=None, reason=None,
+           chunk_size=None, cache=None):
+    """ seeds and solves for the implied volatility, takes flat ndarrays of size n or 1
+    work: dict of reusable buffers, see `_buffer`
+    out: float, [n x 1], the result is written into it
+    sigma0: float, [n x 1], initial guess replacing the rational one where it is within `SIGMA0_BOUNDS`
+    seed: 'rational' or 'table', initial guess of the other options
+    dtype, refine: precision of the seeding stage and the iterations, see `_solve_single`
+    tol, max_iter: price tolerance and maximum number of iterations of the root-finder
+    iterations, residual, reason: [n x 1], optional, the diagnostics are written into them, see `_diagnostics`
+    chunk_size: solve chunks of `chunk_size` options, see `calcbsimpvol.src.parallel`
+    cache: `ResultCache`, only the options which are not cached are solved
+
+    Returns:
+        sigma: float, [n x 1]
+
+    """
+    if cache is not None:
+        if iterations is not None:
+            raise ValueError('diagnostics are not available with a cache')
+        return cache._solve(
+            partial(
+                _solve, engine=engine, workers=workers, work=work, seed=seed, dtype=dtype, refine=refine, tol=tol,
+                max_iter=max_iter, chunk_size=chunk_size
+            ),
+            [cp, P, S, K, tau, r, q], out=out, sigma0=sigma0, dtype=_result_dtype(dtype, refine)
+        )
+    if workers != 1 or chunk_size is not None:
+        from .parallel import solve_chunked
+        if out is None:
+            out = empty(_size([cp, P, S, K, tau, r, q]), dtype=_result_dtype(dtype, refine))
+        return solve_chunked(
+            partial(_solve, engine=engine, seed=seed, dtype=dtype, refine=refine, tol=tol, max_iter=max_iter),
+            [cp, P, S, K, tau, r, q], workers, chunk_size, out=out, sigma0=sigma0,
+            iterations=iterations, residual=residual, reason=reason
+        )
+    if work is None:
+        work = dict()
+    started = _start()
+    n = _size([cp, P, S, K, tau, r, q])
+
+    # forward space: F = S * exp((r - q) * tau), DF = exp(-r * tau)
+    # x = log(F / K) = log(S / K) + (r - q) * tau
+    tmp = _buffer(work, 'tmp', n)
+    x = _buffer(work, 'x', n)
+    divide(S, K, out=x)
+    log(x, out=x)
+    subtract(r, q, out=tmp)
+    multiply(tmp, tau, out=tmp)
+    add(x, tmp, out=x)
+
+    # DF * F = S * exp(-q * tau)
+    DF_F = _buffer(work, 'DF_F', n)
+    multiply(q, tau, out=DF_F)
+    negative(DF_F, out=DF_F)
+    exp(DF_F, out=DF_F)
+    multiply(DF_F, S, out=DF_F)
+    _stop('forward', started, n)
+
+    return _solve_forward(
+        cp, P, x, tau, DF_F, engine, work, out, sigma0, seed, dtype, refine, tol, max_iter, iterations, residual, reason
+    )
+
+
+def _solve_black76(cp, P, F, K, tau, DF, engine='numpy', workers=1, work=None, out=None, sigma0=None,
+                   seed='rational', dtype=float64, refine=False, tol=1e-12, max_iter=10, iterations=None,
+                   residual=None, reason=None, chunk_size=None, cache=None):
+    """ seeds and solves for the Black-76 implied volatility, takes flat ndarrays of size n or 1
+    see `_solve`
+
+    """
+    if cache is not None:
+        if iterations is not None:
+            raise ValueError('diagnostics are not available with a cache')
+        return cache._solve(
+            partial(
+                _solve_black76, engine=engine, workers=workers, work=work, seed=seed, dtype=dtype, refine=refine,
+                tol=tol, max_iter=max_iter, chunk_size=chunk_size
+            ),
+            [cp, P, F, K, tau, DF], out=out, sigma0=sigma0, dtype=_result_dtype(dtype, refine)
+        )
+    if workers != 1 or chunk_size is not None:
+        from .parallel import solve_chunked
+        if out is None:
+            out = empty(_size([cp, P, F, K, tau, DF]), dtype=_result_dtype(dtype, refine))
+        return solve_chunked(
+            partial(_solve_black76, engine=engine, seed=seed, dtype=dtype, refine=refine, tol=tol, max_iter=max_iter),
+            [cp, P, F, K, tau, DF], workers, chunk_size, out=out, sigma0=sigma0,
+            iterations=iterations, residual=residual, reason=reason
+        )
+    if work is None:
+        work = dict()
+    started = _start()
+    n = _size([cp, P, F, K, tau, DF])
+
+    x = _buffer(work, 'x', n)
+    divide(F, K, out=x)
+    log(x, out=x)
+
+    DF_F = _buffer(work, 'DF_F', n)
+    multiply(DF, F, out=DF_F)
+    _stop('forward', started, n)
+
+    return _solve_forward(
+        cp, P, x, tau, DF_F, engine, work, out, sigma0, seed, dtype, refine, tol, max_iter, iterations, residual, reason
+    )
+
+
+def _solve_forward(cp, P, x, tau, DF_F, engine='numpy', work=None, out=None, sigma0=None, seed='rational',
+                   dtype=float64, refine=False, tol=1e-12, max_iter=10, iterations=None, residual=None, reason=None):
+    """ seeds and solves in normalised forward space
+    cp: int, call = [+1], put = [-1], [n x 1] or [1 x 1]
+    P: float, option price, [n x 1] or [1 x 1]
+    x: float, log forward moneyness, log(F / K), [n x 1], overwritten with -|x|
+    tau: float, time to expiry, [n x 1] or [1 x 1]
+    DF_F: float, discounted forward, DF * F, [n x 1]
+    iterations, residual, reason: [n x 1], optional, the diagnostics are written into them, see `_diagnostics`
+
+    Each option is solved on its out-of-the-money side. Using the symmetry
+    put(x, v) / K = call(-x, v) / F, all options become out-of-the-money calls at x <= 0
+    with the normalised price c = (P - intrinsic value) / (DF * min(F, K)). Deep
+    out-of-the-money puts are therefore not turned into deep in-the-money calls,
+    and the rational initial guess is only ever evaluated on its D- domain.
+    The root-finder solves for the normalised volatility v = sigma * sqrt(tau).
+    Options without time value are set to NaN without iterating.
+
+    Returns:
+        sigma: float, [n x 1]
+
+    """
+    # Householder's root-finder
+    k_max = max_iter
+    tolerance = asarray(tol)
+
+    if engine not in ('numpy', 'numba', 'jaeckel'):
+        raise ValueError('unknown engine: {}, expected `numpy`, `numba` or `jaeckel`'.format(engine))
+    if seed not in ('rational', 'table'):
+        raise ValueError('unknown seed: {}, expected `rational` or `table`'.format(seed))
+    if not tolerance > 0 or max_iter < 0:
+        raise ValueError('tol must be positive and max_iter must not be negative')
+    single = _result_dtype(dtype, False) == float32
+    if single and engine != 'numpy':
+        raise ValueError('dtype=float32 requires the `numpy` engine')
+    if work is None:
+        work = dict()
+    started = _start()
+    n = size(x)
+
+    # every option is solved on its out-of-the-money side, as a call at x <= 0:
+    # a put at x normalised by K is a call at -x normalised by F, the prices of
+    # in-the-money options are reduced to their time value (put-call parity)
+    is_call = _buffer(work, 'is_call', n, dtype=bool)
+    not_equal(cp, -1, out=is_call)
+    mirror = _buffer(work, 'mirror', n, dtype=bool)
+    greater(x, 0, out=mirror)
+    itm = _buffer(work, 'itm', n, dtype=bool)
+    equal(mirror, is_call, out=itm)
+
+    # price scale of the out-of-the-money side, DF * min(F, K)
+    scale = _buffer(work, 'scale', n)
+    maximum(x, 0, out=scale)
+    negative(scale, out=scale)
+    exp(scale, out=scale)
+    multiply(scale, DF_F, out=scale)
+
+    # x = -|log(F / K)|, K / F = exp(|log(F / K)|)
+    absolute(x, out=x)
+    negative(x, out=x)
+    K_F = _buffer(work, 'K_F', n)
+    negative(x, out=K_F)
+    exp(K_F, out=K_F)
+
+    # c = P / scale - (K / F - 1) for in-the-money options
+    c = _buffer(work, 'c', n)
+    divide(P, scale, out=c)
+    tmp = _buffer(work, 'tmp', n)
+    subtract(K_F, 1, out=tmp)
+    subtract(c, tmp, out=c, where=itm)
+
+    # quotes outside of the no-arbitrage bounds (or of the domain) have no implied volatility,
+    # with x and c set to NaN they are neither seeded nor iterated, see `_bounds`
+    outside = _bounds(x, c, tau, scale, work, reason)
+    copyto(x, nan, where=outside)
+    copyto(c, nan, where=outside)
+
+    # the tolerance applies to the option price, |P - call| <= tolerance
+    tol = _buffer(work, 'tol', n)
+    divide(tolerance, scale, out=tol)
+
+    sqrt_tau = _buffer(work, 'sqrt_tau', n)
+    sqrt(tau, out=sqrt_tau)
+    _stop('normalisation', started, n)
+
+    if engine == 'jaeckel':
+        from .jaeckel import solve, N_ITERATIONS
+        started = _start()
+        sigma = solve(x, c, sqrt_tau, out=out)
+        _stop('solve', started, n)
+        if iterations is not None:
+            copyto(iterations, N_ITERATIONS)
+            copyto(iterations, 0, where=isnan(sigma))
+        if residual is not None:
+            v = multiply(sigma, sqrt_tau, out=_buffer(work, 'v', n))
+            copyto(residual, _bs_eval(x, K_F, c, v, work)[0])
+    elif engine == 'numba' and seed == 'rational':
+        from .jit import solve
+        started = _start()
+        sigma = solve(x, K_F, c, sqrt_tau, tol, k_max, out=out, sigma0=sigma0, iterations=iterations, residual=residual)
+        _stop('solve', started, n)
+    else:
+        if seed == 'table':
+            from .table import seed as seed_fcn
+        else:
+            seed_fcn = _seed
+        if single:
+            sigma = _solve_single(
+                x, K_F, c, tol, sqrt_tau, k_max, seed_fcn, work, out, sigma0, refine, iterations, residual
+            )
+        else:
+            v = _initial_guess(x, c, sqrt_tau, seed_fcn, work, _buffer(work, 'v', n), sigma0)
+            if engine == 'numba':
+                # the tabulated initial guess is handed over like a warm start
+                from .jit import solve
+                # tau = 0 gives a NaN guess, the option is NaN either way
+                with errstate(divide='ignore', invalid='ignore'):
+                    divide(v, sqrt_tau, out=v)
+                started = _start()
+                sigma = solve(x, K_F, c, sqrt_tau, tol, k_max, out=out, sigma0=v, iterations=iterations, residual=residual)
+                _stop('solve', started, n)
+            else:
+                # quotes outside of the bounds are dropped before the first iteration
+                copyto(v, nan, where=outside)
+                sigma = _householder(x, K_F, c, v, tol, k_max, work, out, iterations, residual)
+                divide(sigma, sqrt_tau, out=sigma)
+
+    if residual is not None:
+        # in units of the option price, P - price at the returned (or last) volatility
+        multiply(residual, scale, out=residual)
+    if reason is not None:
+        unresolved = _buffer(work, 'unresolved', n, dtype=bool)
+        equal(reason, CONVERGED, out=unresolved)
+        logical_and(unresolved, isnan(sigma, out=_buffer(work, 'sigma_nan', n, dtype=bool)), out=unresolved)
+        copyto(reason, NOT_CONVERGED, where=unresolved)
+    return sigma
+
+
+def _bounds(x, c, tau, scale, work, reason=None):
+    """ no-arbitrage bounds and domain check, takes the normalised flat ndarrays of `_solve_forward`
+    x: float, log forward moneyness of the out-of-the-money side, x <= 0, [n x 1]
+    c: float, normalised time value, [n x 1]
+    tau: float, time to expiry, [n x 1] or [1 x 1]
+    scale: float, price scale of the out-of-the-money side, DF * min(F, K), [n x 1]
+    reason: int, [n x 1], optional, CONVERGED or the reason code of the options outside is written into it
+
+    The normalised call price at x <= 0 is bounded by 0 < c < 1, i.e. the price of an option
+    lies strictly between its intrinsic value and DF * F (calls) or DF * K (puts).
+
+    Returns:
+        outside: bool, [n x 1], options without an implied volatility
+
+    """
+    n = size(x)
+    valid = _buffer(work, 'outside', n, dtype=bool)
+    bound = _buffer(work, 'outside_bound', n, dtype=bool)
+    isfinite(x, out=valid)
+    logical_and(valid, isfinite(c, out=bound), out=valid)
+    logical_and(valid, greater(scale, 0, out=bound), out=valid)
+    logical_and(valid, greater(tau, 0, out=bound), out=valid)
+    logical_and(valid, isfinite(tau, out=bound), out=valid)
+    if reason is not None:
+        reason[...] = OUTSIDE_DOMAIN
+        copyto(reason, CONVERGED, where=valid)
+        copyto(reason, ABOVE_UPPER_BOUND, where=logical_and(valid, greater_equal(c, 1, out=bound), out=bound))
+        copyto(reason, BELOW_INTRINSIC, where=logical_and(valid, less_equal(c, 0, out=bound), out=bound))
+    logical_and(valid, greater(c, 0, out=bound), out=valid)
+    logical_and(valid, less(c, 1, out=bound), out=valid)
+    return logical_not(valid, out=valid)
+
+
+def _diagnostics(n):
+    """ arrays the per-option diagnostics of `diagnostics=True` are written into
+    iterations: int, number of Householder iterations (2 for the jaeckel engine, 0 if not iterated)
+    residual: float, P - model price at the returned implied volatility, or at the last iterate
+    reason: int8, CONVERGED, BELOW_INTRINSIC, ABOVE_UPPER_BOUND, OUTSIDE_DOMAIN or NOT_CONVERGED, see `REASONS`
+    """
+    return dict(iterations=zeros(n, dtype=intp), residual=full(n, nan), reason=empty(n, dtype=int8))
+
+
+def _initial_guess(x, c, sqrt_tau, seed_fcn, work, v, sigma0=None):
+    """ initial guess of the normalised volatility, written into `v`
+    sigma0: float, [n x 1], warm start, `seed_fcn` is only evaluated where sigma0 is not usable
+    """
+    started = _start()
+    n = size(x)
+    if sigma0 is None:
+        seed_fcn(x, c, work, out=v)
+        _stop('seed', started, n)
+        return v
+    warm = _buffer(work, 'warm', n, dtype=bool)
+    greater(sigma0, SIGMA0_BOUNDS[0], out=warm)
+    logical_and(warm, less(sigma0, SIGMA0_BOUNDS[1], out=_buffer(work, 'warm_bound', n, dtype=bool)), out=warm)
+    x_seed = _copy_to(work, 'x_seed', x, n)
+    copyto(x_seed, nan, where=warm)
+    seed_fcn(x_seed, c, work, out=v)
+    multiply(sigma0, sqrt_tau, out=_buffer(work, 'tmp', n))
+    copyto(v, work['tmp'][:n], where=warm)
+    _stop('seed', started, n)
+    return v
+
+
+def _solve_single(x, K_F, c, tol, sqrt_tau, k_max, seed_fcn, work, out=None, sigma0=None, refine=False,
+                  iterations=None, residual=None):
+    """ seeding stage and iterations in single precision, takes the normalised flat ndarrays of `_solve_forward`
+
+    The float32 buffers are kept in `work['float32']`. Single precision resolves the normalised price
+    to about 1e-7, so the tolerance is relative, |e| <= max(`SINGLE_RTOL` * c, tol), instead of 1e-12.
+    Options which cannot be resolved in single precision, e.g. little time value on top of a large
+    price, are solved again in float64. With `refine`, the float32 solution is the initial guess
+    of the float64 root-finder for all options, which usually converges in a single iteration.
+    `iterations` counts the iterations of both precisions, `residual` is the one of the last.
+
+    Returns:
+        sigma: float32, [n x 1] or float64 with `refine`
+
+    """
+    n = size(x)
+    single = work.get('float32')
+    if single is None:
+        single = work['float32'] = dict(dtype=float32)
+    x_single = _copy_to(single, 'x', x, n)
+    K_F_single = _copy_to(single, 'K_F', K_F, n)
+    c_single = _copy_to(single, 'c', c, n)
+    sqrt_tau_single = _copy_to(single, 'sqrt_tau', sqrt_tau, n)
+    # operands of mixed precision would be cast chunk by chunk in temporary buffers
+    tol_single = _copy_to(single, 'tol', tol, n)
+    maximum(tol_single, multiply(c_single, SINGLE_RTOL, out=_buffer(single, 'v_out', n)), out=tol_single)
+
+    v = _initial_guess(x_single, c_single, sqrt_tau_single, seed_fcn, single, _buffer(single, 'v', n), sigma0)
+    no_value = _buffer(work, 'no_value', n, dtype=bool)
+    isnan(c, out=no_value)
+    copyto(v, nan, where=no_value)
+    # the derivatives of options which float32 cannot resolve underflow to zero, their Householder step is 0 / 0,
+    # i.e. NaN, and they are solved again in float64 below
+    with errstate(divide='ignore', invalid='ignore'):
+        v_single = _householder(
+            x_single, K_F_single, c_single, v, tol_single, k_max, single, _buffer(single, 'v_out', n), iterations,
+            residual
+        )
+
+    again = _buffer(work, 'again', n, dtype=bool)
+    not_equal(v_single, v_single, out=again)
+    logical_or(again, less(c, SINGLE_C_MIN, out=_buffer(work, 'again_bound', n, dtype=bool)), out=again)
+    logical_and(again, logical_not(no_value, out=no_value), out=again)
+    m = count_nonzero(again)
+    if m:
+        positions = _positions(again, work)
+        x_d = _compress(positions, m, x, _buffer(work, 'again_x', n))
+        K_F_d = _compress(positions, m, K_F, _buffer(work, 'again_K_F', n))
+        c_d = _compress(positions, m, c, _buffer(work, 'again_c', n))
+        tol_d = _compress(positions, m, tol, _buffer(work, 'again_tol', n))
+        if iterations is not None:
+            iterations_d = _compress(positions, m, iterations, _buffer(work, 'again_iterations', n, dtype=intp))
+        v_d = _initial_guess(x_d, c_d, None, seed_fcn, work, _buffer(work, 'again_v', m))
+
+    if refine:
+        v = _copy_to(work, 'v', v_single, n)
+        if m:
+            place(v, again, v_d)
+        refined = None if iterations is None else _buffer(work, 'refine_iterations', n, dtype=intp)
+        sigma = _householder(x, K_F, c, v, tol, k_max, work, out, refined, residual)
+        divide(sigma, sqrt_tau, out=sigma)
+        if iterations is not None:
+            add(iterations, refined, out=iterations)
+        return sigma
+
+    if m:
+        refined = None if iterations is None else _buffer(work, 'refine_iterations', m, dtype=intp)
+        residual_d = None if residual is None else _buffer(work, 'again_residual', m)
+        place(v_single, again, _householder(
+            x_d, K_F_d, c_d, v_d, tol_d, k_max, work, _buffer(single, 'again_out', m), refined, residual_d
+        ))
+        if iterations is not None:
+            add(iterations_d, refined, out=iterations_d)
+            place(iterations, again, iterations_d)
+        if residual is not None:
+            place(residual, again, residual_d)
+    if out is None:
+        out = empty(n, dtype=float32)
+    return divide(v_single, sqrt_tau_single, out=out)
+
+
+def _buffer(work, key, n, dtype=None):
+    """ view of length `n` on the work buffer `key`, (re)allocated only if it is missing or too small
+    float buffers are of the dtype of the work dict, `work['dtype']`, float64 if it is not set
+    """
+    if dtype is None:
+        dtype = work.get('dtype', float64)
+    buf = work.get(key)
+    if buf is None or buf.shape[0] < n or buf.dtype != dtype:
+        buf = empty(n, dtype=dtype)
+        work[key] = buf
+        _allocated(buf.nbytes)
+    return buf[:n]
+
+
+def _arange(work, n):
+    """ cached arange(n) """
+    positions = work.get('arange')
+    if positions is None or positions.shape[0] < n:
+        positions = arange(n)
+        work['arange'] = positions
+        _allocated(positions.nbytes)
+    return positions[:n]
+
+
+def _positions(condition, work):
+    """ position of each selected element after compaction, the dropped ones point to the last slot """
+    n = size(condition)
+    positions = _buffer(work, 'positions', n, dtype=intp)
+    copyto(positions, condition)
+    cumsum(positions, out=positions)
+    subtract(positions, 1, out=positions)
+    dropped = logical_not(condition, out=_buffer(work, 'dropped', n, dtype=bool))
+    copyto(positions, n - 1, where=dropped)
+    return positions
+
+
+def _compress(positions, m, arr, out):
+    """ same as compress(condition, arr) for the `m` selected elements, but without allocating
+    `out` must be as long as `arr`, its last slot collects the dropped elements
+    """
+    put(out, positions, arr, mode='clip')
+    return out[:m]
+
+
+def _copy_to(work, key, arg, n):
+    """ copies (or broadcasts) `arg` into the work buffer `key`, unless it already is that buffer """
+    buf = _buffer(work, key, n)
+    if not may_share_memory(buf, arg):
+        buf[...] = arg
+    return buf
+
+
+def _householder(x, K_F, c, v, tolerance, k_max, work=None, out=None, iterations=None, residual=None):
+    """ fused Householder (3rd order) root-finder in normalised forward space, takes flat ndarrays
+    x: float, log forward moneyness, log(F / K), [n x 1]
+    K_F: float, exp(-x), [n x 1]
+    c: float, normalised call price, P / (DF * F), [n x 1]
+    v: float, initial guess of the normalised volatility, sigma * sqrt(tau), [n x 1]
+    tolerance: float, [n x 1] or [1 x 1]
+    work: dict of reusable buffers, see `_buffer`
+    out: float, [n x 1], the result is written into it
+    iterations: int, [n x 1], optional, number of iterations of each option is written into it
+    residual: float, [n x 1], optional, c - call(v) at the last iterate of each option is written into it
+
+    Converged options are dropped by compacting the working arrays,
+    so each iteration only touches the options which are still active.
+    Options which did not converge after `k_max` iterations are set to NaN.
+
+    Returns:
+        v: float, normalised volatility, [n x 1]
+
+    """
+    if work is None:
+        work = dict()
+    n = size(v)
+    if out is None:
+        out = empty(n, dtype=work.get('dtype', float64))
+    tmp = _buffer(work, 'tmp', n)
+
+    # working copies of the per-option invariants, compacted as options converge
+    x = _copy_to(work, 'x', x, n)
+    K_F = _copy_to(work, 'K_F', K_F, n)
+    c = _copy_to(work, 'c', c, n)
+    v = _copy_to(work, 'v', v, n)
+    tol = _copy_to(work, 'tol', tolerance, n)
+    idx = _buffer(work, 'idx', n, dtype=intp)
+    idx[...] = _arange(work, n)
+
+    compacted = [x, K_F, c, v, tol]
+    scratch = _buffer(work, 'scratch', n)
+    scratch_idx = _buffer(work, 'scratch_idx', n, dtype=intp)
+    active = _buffer(work, 'active', n, dtype=bool)
+
+    m = n
+    k = 0
+    while m > 0:
+        started = _start()
+        evaluated = m
+        e, vega, vomma, ultima = _bs_eval(x[:m], K_F[:m], c[:m], v[:m], work)
+        C = active[:m]
+        absolute(e, out=tmp[:m])
+        greater(tmp[:m], tol[:m], out=C)
+        m_active = count_nonzero(C)
+        if m_active < m:
+            # store the results of the converged options before they are dropped
+            put(out, idx[:m], v[:m])
+            if iterations is not None:
+                put(iterations, idx[:m], k)
+            if residual is not None:
+                put(residual, idx[:m], e)
+            positions = _positions(C, work)
+            for arr in compacted + [e, vega, vomma, ultima]:
+                arr[:m_active] = _compress(positions, m_active, arr[:m], scratch[:m])
+            idx[:m_active] = _compress(positions, m_active, idx[:m], scratch_idx[:m])
+            m = m_active
+        if m == 0 or k == k_max:
+            _stop('iteration', started, evaluated, iteration=k)
+            break
+
+        e = e[:m]
+        vega = vega[:m]
+        vomma = vomma[:m]
+        ultima = ultima[:m]
+        # numerator = 6 * e * vega ** 2 + 3 * e ** 2 * vomma
+        # denominator = -6 * vega ** 3 - 6 * e * vega * vomma - e ** 2 * ultima
+        numerator = _buffer(work, 'numerator', n)[:m]
+        denominator = _buffer(work, 'denominator', n)[:m]
+        t = tmp[:m]
+        multiply(e, vomma, out=t)
+        multiply(vega, vega, out=numerator)
+        multiply(numerator, 2, out=numerator)
+        add(numerator, t, out=numerator)
+        multiply(numerator, e, out=numerator)
+        multiply(numerator, 3, out=numerator)
+
+        multiply(vega, vega, out=denominator)
+        add(denominator, t, out=denominator)
+        multiply(denominator, vega, out=denominator)
+        multiply(denominator, -6, out=denominator)
+        multiply(e, e, out=t)
+        multiply(t, ultima, out=t)
+        subtract(denominator, t, out=denominator)
+
+        divide(numerator, denominator, out=t)
+        subtract(v[:m], t, out=v[:m])
+        _stop('iteration', started, evaluated, iteration=k)
+        k = k + 1
+
+    put(out, idx[:m], nan)
+    if iterations is not None:
+        put(iterations, idx[:m], k)
+    if residual is not None and m > 0:
+        put(residual, idx[:m], e[:m])
+    return out
+
 
+def _bs_eval(x, K_F, c, v, work):
+    """ objective and its derivatives w.r.t. v in normalised forward space, writes into the buffers in `work`
+    x: float, log forward moneyness, log(F / K)
+    K_F: float, exp(-x)
+    c, v: float, normalised call price and current estimate of the normalised volatility
 
-def _fcnN(x):
+    The normalised call price is N(d1) - K / F * N(d2) and its derivative w.r.t. v is n(d1)
+    """
+    m = size(x)
+    d1 = _buffer(work, 'd1', m)
+    d2 = _buffer(work, 'd2', m)
+    fcnN_d1 = _buffer(work, 'fcnN_d1', m)
+    fcnN_d2 = _buffer(work, 'fcnN_d2', m)
+    obj = _buffer(work, 'obj', m)
+    vega = _buffer(work, 'vega', m)
+    vomma = _buffer(work, 'vomma', m)
+    ultima = _buffer(work, 'ultima', m)
+
+    # d1 = x / v + v / 2, d2 = d1 - v
+    divide(x, v, out=d1)
+    multiply(v, 0.5, out=d2)
+    add(d1, d2, out=d1)
+    subtract(d1, v, out=d2)
+
+    _fcnN(d1, out=fcnN_d1)
+    _fcnN(d2, out=fcnN_d2)
+
+    # obj = c - (N(d1) - K / F * N(d2))
+    subtract(c, fcnN_d1, out=obj)
+    multiply(K_F, fcnN_d2, out=ultima)
+    add(obj, ultima, out=obj)
+
+    # vega = n(d1)
+    _fcnn(d1, out=vega)
+
+    # vomma = vega * d1 * d2 / v
+    d1d2 = fcnN_d2
+    multiply(d1, d2, out=d1d2)
+    multiply(vega, d1d2, out=vomma)
+    divide(vomma, v, out=vomma)
+
+    # ultima = -1 * vega * (d1 * d2 * (1 - d1 * d2) + d1 ** 2 + d2 ** 2) / (v ** 2)
+    subtract(1, d1d2, out=ultima)
+    multiply(ultima, d1d2, out=ultima)
+    multiply(d1, d1, out=d1)
+    multiply(d2, d2, out=d2)
+    add(ultima, d1, out=ultima)
+    add(ultima, d2, out=ultima)
+    multiply(ultima, vega, out=ultima)
+    multiply(v, v, out=d1)
+    divide(ultima, d1, out=ultima)
+    negative(ultima, out=ultima)
+
+    return obj, vega, vomma, ultima
+
+
+def _seed(x, c, work=None, out=None):
+    """ initial guess of the normalised volatility v = sigma * sqrt(tau), Li (2006)
+    x: float, log forward moneyness, [n x 1]
+    c: float, option price normalised by the discounted forward, DF * F, [n x 1]
+
+    Eq. (19) is only evaluated for the options within x = {-0.5, +0.5}, separately
+    for each domain. Options outside of the Domain-of-Approximation get a fixed guess of 0.8
+    Chains of less than `_SEED_PARTITION` options evaluate both domains on every option instead,
+    which is faster than compacting them.
+    """
+    if work is None:
+        work = dict()
+    n = size(x)
+    v = empty(n) if out is None else out
+    mask = _buffer(work, 'seed_mask', n, dtype=bool)
+    bound = _buffer(work, 'seed_bound', n, dtype=bool)
+
+    if n < _SEED_PARTITION:
+        c_d = maximum(c, 0, out=_buffer(work, 'seed_c', n))
+        _fcnv(x, c_d, work, out=v)  # D- Domain (x < 1)
+        # transformed price, exp(x) * c + 1 - exp(x), evaluated at -x
+        exp_x = exp(x, out=_buffer(work, 'seed_exp_x', n))
+        multiply(exp_x, c, out=c_d)
+        add(c_d, 1, out=c_d)
+        subtract(c_d, exp_x, out=c_d)
+        maximum(c_d, 0, out=c_d)
+        x_d = negative(x, out=_buffer(work, 'seed_x', n))
+        greater(x, 0, out=mask)
+        copyto(v, _fcnv(x_d, c_d, work, out=_buffer(work, 'seed_v', n)), where=mask)  # D+ Domain (x > 1)
+        less(x, -0.5, out=mask)
+        greater(x, 0.5, out=bound)
+        copyto(v, 0.8, where=logical_or(mask, bound, out=mask))
+    else:
+        v[...] = 0.8
+        greater_equal(x, -0.5, out=mask)
+        less_equal(x, 0, out=bound)
+        logical_and(mask, bound, out=mask)  # D- Domain (x < 1)
+        m = count_nonzero(mask)
+        positions = _positions(mask, work)
+        x_d = _compress(positions, m, x, _buffer(work, 'seed_x', n))
+        c_d = _compress(positions, m, c, _buffer(work, 'seed_c', n))
+        maximum(c_d, 0, out=c_d)
+        place(v, mask, _fcnv(x_d, c_d, work, out=_buffer(work, 'seed_v', m)))
+
+        greater(x, 0, out=mask)
+        less_equal(x, 0.5, out=bound)
+        logical_and(mask, bound, out=mask)  # D+ Domain (x > 1)
+        m = count_nonzero(mask)
+        positions = _positions(mask, work)
+        x_d = _compress(positions, m, x, _buffer(work, 'seed_x', n))
+        c_d = _compress(positions, m, c, _buffer(work, 'seed_c', n))
+        # transformed price, exp(x) * c + 1 - exp(x), evaluated at -x
+        exp_x = exp(x_d, out=_buffer(work, 'seed_exp_x', m))
+        multiply(exp_x, c_d, out=c_d)
+        add(c_d, 1, out=c_d)
+        subtract(c_d, exp_x, out=c_d)
+        maximum(c_d, 0, out=c_d)
+        negative(x_d, out=x_d)
+        place(v, mask, _fcnv(x_d, c_d, work, out=_buffer(work, 'seed_v', m)))
+
+    # Domain-of-Approximation is x = {-0.5, +0.5}, v = {0, 1}, x/v = {-2, 2}
+    x_v = divide(x, v, out=_buffer(work, 'seed_x_v', n))
+    greater(v, 0, out=mask)
+    less(v, 1, out=bound)
+    logical_and(mask, bound, out=mask)
+    less_equal(x_v, 2, out=bound)
+    logical_and(mask, bound, out=mask)
+    greater_equal(x_v, -2, out=bound)
+    logical_and(mask, bound, out=mask)
+    copyto(v, 0.8, where=bitwise_not(mask, out=mask))
+    return v
+
+
+def _fcnv(x, c, work=None, out=None):
+    """  Eq. (19), Li (2006) """
+    if work is None:
+        work = dict()
+    m = size(x)
+    sqrt_c = sqrt(c, out=_buffer(work, 'sqrt_c', m))
+    inner = _buffer(work, 'inner', m)
+    numerator = _horner(_N, x, sqrt_c, _buffer(work, 'fcnv_numerator', m), inner)
+    denominator = _horner(_M, x, sqrt_c, _buffer(work, 'fcnv_denominator', m), inner)
+    add(denominator, 1, out=denominator)
+    divide(numerator, denominator, out=numerator)
+
+    v = empty(m) if out is None else out
+    multiply(x, _P[0], out=v)
+    multiply(sqrt_c, _P[1], out=inner)
+    add(v, inner, out=v)
+    multiply(c, _P[2], out=inner)
+    add(v, inner, out=v)
+    add(v, numerator, out=v)
+    return v
+
+
+def _horner(coefficients, x, y, out, inner):
+    """ bivariate polynomial sum(coefficients[i][j] * x ** i * y ** j), Horner's scheme in x and y """
+    out[...] = 0.
+    for row in reversed(coefficients):
+        inner[...] = row[-1]
+        for coefficient in reversed(row[:-1]):
+            multiply(inner, y, out=inner)
+            add(inner, coefficient, out=inner)
+        multiply(out, x, out=out)
+        add(out, inner, out=out)
+    return out
+
+
+def _fcnN(x, out=None):
     """cumulative density function (cdf) of normal distribution """
-    return 0.5 * (1. + erf(x / sqrt(2)))
+    if out is None:
+        return 0.5 * (1. + erf(x / sqrt(2)))
+    # Python floats keep the dtype of `x`, NumPy scalars would promote float32 to float64
+    multiply(x, float(1 / sqrt(2)), out=out)
+    erf(out, out=out)
+    add(out, 1., out=out)
+    multiply(out, 0.5, out=out)
+    return out
 
 
-def _fcnn(x):
+def _fcnn(x, out=None):
     """probability density function (pdf) of normal distribution """
-    return exp(-0.5 * x ** 2) / sqrt(2 * pi)
+    if out is None:
+        return exp(-0.5 * x ** 2) / sqrt(2 * pi)
+    multiply(x, x, out=out)
+    multiply(out, -0.5, out=out)
+    exp(out, out=out)
+    multiply(out, float(1 / sqrt(2 * pi)), out=out)
+    return out
 
@@ -0,0 +1,406 @@
+"""
+Alternative engine, selected with ``engine='jaeckel'``
+
+Vectorised implementation of P. Jäckel, "Let's Be Rational" (2015/2016).
+The normalised Black function is evaluated in four regions (asymptotic expansion,
+small-t expansion, cumulative normal, scaled complementary error function) to keep
+its relative accuracy over the whole domain. The initial guess is a rational cubic
+interpolation of a transformed inverse on four branches, followed by two third order
+Householder steps on an objective function adapted to each branch. There is no
+tolerance and no early exit; two iterations reach machine precision.
+
+Notation as in the paper: x = log(F / K) <= 0 (out-of-the-money call), s = sigma * sqrt(tau),
+h = x / s, t = s / 2 and beta = P / (DF * sqrt(F * K)), the normalised price with b_max = exp(x / 2).
+"""
+from math import pi, sqrt
+
+import numpy as np
+from scipy.special import comb, erfcx, ndtr, ndtri
+
+DBL_EPSILON = np.finfo(np.float64).eps
+DBL_MIN = np.finfo(np.float64).tiny
+DBL_MAX = np.finfo(np.float64).max
+SQRT_DBL_MAX = sqrt(DBL_MAX)
+SQRT_THREE = sqrt(3.)
+SQRT_ONE_OVER_THREE = sqrt(1. / 3.)
+SQRT_PI_OVER_TWO = sqrt(pi / 2.)
+ONE_OVER_SQRT_TWO = sqrt(0.5)
+ONE_OVER_SQRT_TWO_PI = 1. / sqrt(2. * pi)
+TWO_PI_OVER_SQRT_TWENTY_SEVEN = 2. * pi / sqrt(27.)
+
+ASYMPTOTIC_EXPANSION_ACCURACY_THRESHOLD = -10.
+SMALL_T_EXPANSION_THRESHOLD = 2. * DBL_EPSILON ** (1. / 16.)
+MINIMUM_RATIONAL_CUBIC_CONTROL_PARAMETER = -(1. - sqrt(DBL_EPSILON))
+MAXIMUM_RATIONAL_CUBIC_CONTROL_PARAMETER = 2. / (DBL_EPSILON * DBL_EPSILON)
+
+N_ITERATIONS = 2
+
+# asymptotic expansion for h << 0, Y(h + t) - Y(h - t) with the Mills ratio type function Y = Phi / phi
+# = t / r * sum_k 2 * (-1) ** k * (2k - 1)!! * q ** k * sum_i binom(2k + 1, 2i + 1) * e ** i
+_ASYMPTOTIC_TERMS = 17
+_ASYMPTOTIC = tuple(
+    tuple(2. * (-1) ** k * np.prod(np.arange(2 * k - 1, 0, -2), dtype=float) * comb(2 * k + 1, 2 * i + 1, exact=True)
+          for i in range(k + 1))
+    for k in range(_ASYMPTOTIC_TERMS)
+)
+# Taylor expansion for small t, Y(h + t) - Y(h - t) = sum over odd k of 2 * Y^(k)(h) * t ** k / k!
+_SMALL_T_ORDER = 13
+
+
+def _asymptotic_expansion(h, t):
+    """ normalised Black call for h < -10, see `_black` """
+    e = (t / h) ** 2
+    r = (h + t) * (h - t)
+    q = (h / r) ** 2
+    total = np.zeros_like(h)
+    for row in reversed(_ASYMPTOTIC):
+        inner = np.zeros_like(h)
+        for coefficient in reversed(row):
+            inner = inner * e + coefficient
+        total = total * q + inner
+    return ONE_OVER_SQRT_TWO_PI * np.exp(-0.5 * (h * h + t * t)) * (t / r) * total
+
+
+def _small_t_expansion(h, t):
+    """ normalised Black call for t < 0.21, see `_black` """
+    # derivatives of Y, Y' = 1 + h * Y and Y^(n + 1) = h * Y^(n) + n * Y^(n - 1)
+    y_previous = SQRT_PI_OVER_TWO * erfcx(-ONE_OVER_SQRT_TWO * h)
+    y = 1. + h * y_previous
+    total = 2. * t * y
+    power = t
+    factorial = 1.
+    for n in range(1, _SMALL_T_ORDER):
+        y_previous, y = y, h * y + n * y_previous
+        power = power * t
+        factorial = factorial * (n + 1)
+        if n % 2 == 0:
+            total = total + 2. * y * power / factorial
+    return ONE_OVER_SQRT_TWO_PI * np.exp(-0.5 * (h * h + t * t)) * total
+
+
+def _black(x, s):
+    """ normalised Black call price b(x, s) = exp(x / 2) * Phi(h + t) - exp(-x / 2) * Phi(h - t), x <= 0 """
+    b = np.zeros(np.shape(s))
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore', under='ignore'):
+        positive = s > 0
+        h = x / s
+        t = 0.5 * s
+        # region 1, both h and h + t far in the left tail
+        region = positive & (x < s * ASYMPTOTIC_EXPANSION_ACCURACY_THRESHOLD) & (
+            0.5 * s * s + x < s * (SMALL_T_EXPANSION_THRESHOLD + ASYMPTOTIC_EXPANSION_ACCURACY_THRESHOLD))
+        if np.any(region):
+            b[region] = _asymptotic_expansion(h[region], t[region])
+        left = positive & ~region
+        # region 2, small volatility
+        region = left & (t < SMALL_T_EXPANSION_THRESHOLD)
+        if np.any(region):
+            b[region] = _small_t_expansion(h[region], t[region])
+        left = left & ~region
+        # region 3, b is dominated by the first term
+        region = left & (x + 0.5 * s * s > 0.85 * s)
+        b[region] = (np.exp(0.5 * x[region]) * ndtr(h[region] + t[region])
+                     - np.exp(-0.5 * x[region]) * ndtr(h[region] - t[region]))
+        # region 4
+        region = left & ~region
+        hr = h[region]
+        tr = t[region]
+        b[region] = 0.5 * np.exp(-0.5 * (hr * hr + tr * tr)) * (
+            erfcx(-ONE_OVER_SQRT_TWO * (hr + tr)) - erfcx(-ONE_OVER_SQRT_TWO * (hr - tr)))
+    return b
+
+
+def _vega(x, s):
+    """ derivative of the normalised Black call w.r.t. s """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore', under='ignore'):
+        h = x / s
+        t = 0.5 * s
+        return np.where(s > 0, ONE_OVER_SQRT_TWO_PI * np.exp(-0.5 * (h * h + t * t)), 0.)
+
+
+def _householder_factor(newton, halley, hh3):
+    return (1. + 0.5 * halley * newton) / (1. + newton * (halley + hh3 * newton / 6.))
+
+
+def _rational_cubic(x, x_l, x_r, y_l, y_r, d_l, d_r, r):
+    """ rational cubic interpolation, Eq. (2.4) / Eq. (2.5) of Delbourgo and Gregory (1985) """
+    h = x_r - x_l
+    t = (x - x_l) / h
+    omt = 1. - t
+    t2 = t * t
+    omt2 = omt * omt
+    rational = (y_r * t2 * t + (r * y_r - h * d_r) * t2 * omt + (r * y_l + h * d_l) * t * omt2
+                + y_l * omt2 * omt) / (1. + (r - 3.) * t * omt)
+    linear = y_r * t + y_l * omt
+    y = np.where(r >= MAXIMUM_RATIONAL_CUBIC_CONTROL_PARAMETER, linear, rational)
+    return np.where(np.absolute(h) > 0, y, 0.5 * (y_l + y_r))
+
+
+def _minimum_control_parameter(d_l, d_r, s, prefer_shape_preservation):
+    """ smallest control parameter which preserves monotonicity and convexity """
+    monotonic = (d_l * s >= 0) & (d_r * s >= 0)
+    convex = (d_l <= s) & (s <= d_r)
+    concave = (d_l >= s) & (s >= d_r)
+    fallback = MAXIMUM_RATIONAL_CUBIC_CONTROL_PARAMETER if prefer_shape_preservation else -DBL_MAX
+    s_is_zero = np.absolute(s) < DBL_MIN
+    r1 = np.where(monotonic, np.where(s_is_zero, fallback, (d_r + d_l) / np.where(s_is_zero, 1., s)), -DBL_MAX)
+    d_r_m_s = d_r - s
+    s_m_d_l = s - d_l
+    zero = (np.absolute(d_r_m_s) < DBL_MIN) | (np.absolute(s_m_d_l) < DBL_MIN)
+    r2 = np.where(zero, fallback, np.maximum(
+        np.absolute((d_r - d_l) / np.where(zero, 1., d_r_m_s)),
+        np.absolute((d_r - d_l) / np.where(zero, 1., s_m_d_l))))
+    r2 = np.where(convex | concave, r2, np.where(monotonic & prefer_shape_preservation, fallback, -DBL_MAX))
+    shape = monotonic | convex | concave
+    return np.where(shape, np.maximum(MINIMUM_RATIONAL_CUBIC_CONTROL_PARAMETER, np.maximum(r1, r2)),
+                    MINIMUM_RATIONAL_CUBIC_CONTROL_PARAMETER)
+
+
+def _control_parameter(x_l, x_r, y_l, y_r, d_l, d_r, second_derivative, left, prefer_shape_preservation):
+    """ control parameter of `_rational_cubic` fitting the second derivative at the left or right side """
+    h = x_r - x_l
+    numerator = 0.5 * h * second_derivative + (d_r - d_l)
+    slope = (y_r - y_l) / h
+    denominator = slope - d_l if left else d_r - slope
+    denominator_is_zero = np.absolute(denominator) < DBL_MIN
+    r = np.where(
+        denominator_is_zero,
+        np.where(numerator > 0, MAXIMUM_RATIONAL_CUBIC_CONTROL_PARAMETER, MINIMUM_RATIONAL_CUBIC_CONTROL_PARAMETER),
+        numerator / np.where(denominator_is_zero, 1., denominator)
+    )
+    r = np.where(np.absolute(numerator) < DBL_MIN, 0., r)
+    return np.maximum(r, _minimum_control_parameter(d_l, d_r, slope, prefer_shape_preservation))
+
+
+def _lower_map(x, s):
+    """ f(beta) = 2 pi / sqrt(27) * |x| * Phi(-z) ** 3, z = |x| / (sqrt(3) * s) and its first two derivatives w.r.t. beta """
+    ax = np.absolute(x)
+    z = SQRT_ONE_OVER_THREE * ax / s
+    y = z * z
+    s2 = s * s
+    Phi = ndtr(-z)
+    phi = ONE_OVER_SQRT_TWO_PI * np.exp(-0.5 * y)
+    fpp = pi / 6. * y / (s2 * s) * Phi * (
+        8. * SQRT_THREE * s * ax + (3. * s2 * (s2 - 8.) - 8. * x * x) * Phi / phi) * np.exp(2. * y + 0.25 * s2)
+    Phi2 = Phi * Phi
+    fp = np.where(np.absolute(s) < DBL_MIN, 1., 2. * pi * y * Phi2 * np.exp(y + 0.125 * s2))
+    f = np.where((np.absolute(s) < DBL_MIN) | (ax < DBL_MIN), 0., TWO_PI_OVER_SQRT_TWENTY_SEVEN * ax * Phi2 * Phi)
+    return f, fp, fpp
+
+
+def _inverse_lower_map(x, f):
+    ax = np.absolute(x)
+    return np.where(
+        np.absolute(f) < DBL_MIN, 0.,
+        np.absolute(x / (SQRT_THREE * ndtri(np.cbrt(f / (TWO_PI_OVER_SQRT_TWENTY_SEVEN * ax)))))
+    )
+
+
+def _upper_map(x, s):
+    """ f(beta) = Phi(-s / 2) and its first two derivatives w.r.t. beta """
+    f = ndtr(-0.5 * s)
+    w = (x / s) ** 2
+    fp = np.where(np.absolute(x) < DBL_MIN, -0.5, -0.5 * np.exp(0.5 * w))
+    fpp = np.where(np.absolute(x) < DBL_MIN, 0., SQRT_PI_OVER_TWO * np.exp(w + 0.125 * s * s) * w / s)
+    return f, fp, fpp
+
+
+def _inverse_upper_map(f):
+    return -2. * ndtri(f)
+
+
+def _initial_guess(beta, x, b_max):
+    """ transformed rational guess on the four branches
+
+    Returns:
+        s, s_left, s_right: initial guess and its bracket
+        lower, upper: branches iterating on the objective functions of the lowest / upper segment
+
+    """
+    s_c = np.sqrt(np.absolute(2. * x))
+    b_c = _black(x, s_c)
+    v_c = _vega(x, s_c)
+    s = np.empty_like(beta)
+    s_left = np.full_like(beta, DBL_MIN)
+    s_right = np.full_like(beta, DBL_MAX)
+    lower = np.zeros(np.shape(beta), dtype=bool)
+    upper = np.zeros(np.shape(beta), dtype=bool)
+
+    below = beta < b_c
+    if np.any(below):
+        xb, betab, s_cb, b_cb, v_cb = x[below], beta[below], s_c[below], b_c[below], v_c[below]
+        s_l = s_cb - b_cb / v_cb
+        b_l = _black(xb, s_l)
+        sb = np.empty_like(betab)
+        s_leftb = np.full_like(betab, DBL_MIN)
+        s_rightb = np.full_like(betab, DBL_MAX)
+
+        # lowest branch
+        low = betab < b_l
+        if np.any(low):
+            xl, betal, s_ll, b_ll = xb[low], betab[low], s_l[low], b_l[low]
+            f_l, fp_l, fpp_l = _lower_map(xl, s_ll)
+            r_ll = _control_parameter(0., b_ll, 0., f_l, 1., fp_l, fpp_l, False, True)
+            f = _rational_cubic(betal, 0., b_ll, 0., f_l, 1., fp_l, r_ll)
+            # quadratic interpolation if round-off makes the rational cubic fail, i.e. |x| > 500
+            t = betal / b_ll
+            f = np.where(f > 0, f, (f_l * t + b_ll * (1. - t)) * t)
+            sb[low] = _inverse_lower_map(xl, f)
+            s_rightb[low] = s_ll
+
+        # lower middle branch
+        middle = ~low
+        if np.any(middle):
+            xm, s_lm, b_lm, s_cm, b_cm, v_cm = xb[middle], s_l[middle], b_l[middle], s_cb[middle], b_cb[middle], v_cb[middle]
+            v_lm = _vega(xm, s_lm)
+            r_lm = _control_parameter(b_lm, b_cm, s_lm, s_cm, 1. / v_lm, 1. / v_cm, 0., False, False)
+            sb[middle] = _rational_cubic(betab[middle], b_lm, b_cm, s_lm, s_cm, 1. / v_lm, 1. / v_cm, r_lm)
+            s_leftb[middle] = s_lm
+            s_rightb[middle] = s_cm
+
+        s[below] = sb
+        s_left[below] = s_leftb
+        s_right[below] = s_rightb
+        lower[below] = low
+
+    above = ~below
+    if np.any(above):
+        xa, betaa, s_ca, b_ca, v_ca, b_maxa = x[above], beta[above], s_c[above], b_c[above], v_c[above], b_max[above]
+        s_h = np.where(v_ca > DBL_MIN, s_ca + (b_maxa - b_ca) / v_ca, s_ca)
+        b_h = _black(xa, s_h)
+        sa = np.empty_like(betaa)
+        s_lefta = np.full_like(betaa, DBL_MIN)
+        s_righta = np.full_like(betaa, DBL_MAX)
+
+        # upper middle branch
+        middle = betaa <= b_h
+        if np.any(middle):
+            xm, s_hm, b_hm, s_cm, b_cm, v_cm = xa[middle], s_h[middle], b_h[middle], s_ca[middle], b_ca[middle], v_ca[middle]
+            v_hm = _vega(xm, s_hm)
+            r_hm = _control_parameter(b_cm, b_hm, s_cm, s_hm, 1. / v_cm, 1. / v_hm, 0., True, False)
+            sa[middle] = _rational_cubic(betaa[middle], b_cm, b_hm, s_cm, s_hm, 1. / v_cm, 1. / v_hm, r_hm)
+            s_lefta[middle] = s_cm
+            s_righta[middle] = s_hm
+
+        # upper branch
+        high = ~middle
+        if np.any(high):
+            xh, betah, s_hh, b_hh, b_maxh = xa[high], betaa[high], s_h[high], b_h[high], b_maxa[high]
+            f_h, fp_h, fpp_h = _upper_map(xh, s_hh)
+            finite = (fpp_h > -SQRT_DBL_MAX) & (fpp_h < SQRT_DBL_MAX)
+            r_hh = _control_parameter(b_hh, b_maxh, f_h, 0., fp_h, -0.5, fpp_h, True, True)
+            f = np.where(finite, _rational_cubic(betah, b_hh, b_maxh, f_h, 0., fp_h, -0.5, r_hh), -DBL_MAX)
+            # quadratic interpolation if the rational cubic fails
+            h = b_maxh - b_hh
+            t = (betah - b_hh) / h
+            f = np.where(f > 0, f, (f_h * (1. - t) + 0.5 * h * t) * (1. - t))
+            sa[high] = _inverse_upper_map(f)
+            s_lefta[high] = s_hh
+            # the objective function is b(s) - beta below b_max / 2
+            upper[np.flatnonzero(above)[high]] = betah > 0.5 * b_maxh
+
+        s[above] = sa
+        s_left[above] = s_lefta
+        s_right[above] = s_righta
+
+    return s, s_left, s_right, lower, upper
+
+
+def _step(beta, x, s, b, bp, b_max, s_left, s_right, lower, upper):
+    """ Householder (3rd order) step on the objective function of each branch
+
+    lowest segment: g(s) = 1 / log(b(s)) - 1 / log(beta)
+    upper segment: g(s) = log((b_max - beta) / (b_max - b(s)))
+    otherwise: g(s) = b(s) - beta
+
+    """
+    b_halley = (x / s) ** 2 / s - 0.25 * s
+    b_hh3 = b_halley * b_halley - 3. * (x / (s * s)) ** 2 - 0.25
+
+    # middle segments
+    newton = (beta - b) / bp
+    ds = newton * _householder_factor(newton, b_halley, b_hh3)
+
+    # lowest segment
+    ln_b = np.log(b)
+    ln_beta = np.log(beta)
+    bpob = bp / b
+    newton = (ln_beta - ln_b) * ln_b / ln_beta / bpob
+    halley = b_halley - bpob * (1. + 2. / ln_b)
+    hh3 = b_hh3 + 2. * bpob * bpob * (1. + 3. / ln_b * (1. + 1. / ln_b)) - 3. * b_halley * bpob * (1. + 2. / ln_b)
+    ds = np.where(lower, newton * _householder_factor(newton, halley, hh3), ds)
+    # numerical underflow, bisection instead
+    ds = np.where(lower & ((b <= 0) | (bp <= 0)), 0.5 * (s_left + s_right) - s, ds)
+
+    # upper segment
+    b_max_minus_b = b_max - b
+    g = np.log((b_max - beta) / b_max_minus_b)
+    gp = bp / b_max_minus_b
+    newton = -g / gp
+    halley = b_halley + gp
+    hh3 = b_hh3 + gp * (2. * gp + 3. * b_halley)
+    ds = np.where(upper, newton * _householder_factor(newton, halley, hh3), ds)
+    ds = np.where(upper & ((b >= b_max) | (bp <= DBL_MIN)), 0.5 * (s_left + s_right) - s, ds)
+
+    return np.maximum(-0.5 * s, ds)
+
+
+def normalised_implied_volatility(beta, x, iterations=N_ITERATIONS):
+    """ normalised implied volatility s = sigma * sqrt(tau) of out-of-the-money calls
+    beta: float, normalised price, P / (DF * sqrt(F * K)), [n x 1]
+    x: float, log(F / K) <= 0, [n x 1]
+
+    Returns:
+        s: float, NaN for prices at or below zero and at or above b_max = exp(x / 2), [n x 1]
+
+    """
+    beta = np.asarray(beta, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    b_max = np.exp(0.5 * x)
+    valid = (beta > 0) & (beta < b_max)
+    s = np.full(np.shape(beta), np.nan)
+    if not np.any(valid):
+        return s
+    beta = beta[valid]
+    x = x[valid]
+    b_max = b_max[valid]
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore', under='ignore'):
+        sv, s_left, s_right, lower, upper = _initial_guess(beta, x, b_max)
+        ds = np.full_like(sv, -DBL_MAX)
+        active = np.ones(np.shape(sv), dtype=bool)
+        for k in range(iterations):
+            active = active & (np.absolute(ds) > DBL_EPSILON * sv)
+            if k > 0:
+                # bisection if the step left the bracket
+                outside = active & ~((sv > s_left) & (sv < s_right))
+                sv = np.where(outside, 0.5 * (s_left + s_right), sv)
+                active = active & ~(outside & (s_right - s_left <= DBL_EPSILON * sv))
+            b = _black(x, sv)
+            bp = _vega(x, sv)
+            # tighten the bracket
+            s_right = np.where((b > beta) & (sv < s_right), sv, s_right)
+            s_left = np.where((b < beta) & (sv > s_left), sv, s_left)
+            ds = _step(beta, x, sv, b, bp, b_max, s_left, s_right, lower, upper)
+            sv = np.where(active, sv + ds, sv)
+
+    s[valid] = sv
+    return s
+
+
+def solve(x, c, sqrt_tau, out=None):
+    """ entry point of the engine, takes the normalised flat ndarrays of `calcbsimpvol._solve_forward`
+    x: float, log forward moneyness of the out-of-the-money side, x <= 0, [n x 1]
+    c: float, normalised call price, [n x 1]
+    out: float, [n x 1], the result is written into it
+
+    Returns:
+        sigma: float, [n x 1]
+
+    """
+    # c is normalised by the forward, beta by sqrt(F * K) = F * exp(-x / 2)
+    beta = c * np.exp(0.5 * x)
+    sigma = normalised_implied_volatility(beta, x) / sqrt_tau
+    if out is None:
+        return sigma
+    np.copyto(out, sigma)
+    return out
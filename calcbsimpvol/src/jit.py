@@ -0,0 +1,133 @@
+"""
+Optional numba backend, selected with ``engine='numba'``
+
+Each option is solved independently in a compiled scalar loop: the rational
+seed of Li (2006) followed by Householder iterations with an early exit per option.
+It follows the NumPy engine step by step, so both engines agree up to rounding.
+"""
+from math import erf, exp, sqrt, pi, nan
+
+import numpy as np
+
+from .calcbsimpvol import _P, _N, _M, SIGMA0_BOUNDS
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _table(coefficients):
+    """ pads the rows of the coefficients of Eq. (19) to a dense [5 x 5] array """
+    table = np.zeros((5, 5))
+    for i, row in enumerate(coefficients):
+        table[i, :len(row)] = row
+    return table
+
+
+_N_TABLE = _table(_N)
+_M_TABLE = _table(_M)
+
+
+def _fcnv(x, c):
+    """  Eq. (19), Li (2006) """
+    y = sqrt(c)
+    numerator = 0.
+    denominator = 0.
+    for i in range(4, -1, -1):
+        inner_n = 0.
+        inner_m = 0.
+        for j in range(4 - i, -1, -1):
+            inner_n = inner_n * y + _N_TABLE[i, j]
+            inner_m = inner_m * y + _M_TABLE[i, j]
+        numerator = numerator * x + inner_n
+        denominator = denominator * x + inner_m
+    return _P[0] * x + _P[1] * y + _P[2] * c + numerator / (1 + denominator)
+
+
+def _seed(x, c):
+    """ initial guess of the normalised volatility v = sigma * sqrt(tau), see `calcbsimpvol._seed` """
+    if -0.5 <= x <= 0:
+        v = _fcnv(x, max(c, 0.))
+    elif 0 < x <= 0.5:
+        exp_x = exp(x)
+        v = _fcnv(-x, max(exp_x * c + 1 - exp_x, 0.))
+    else:
+        return 0.8
+    if not (0 < v < 1 and -2 <= x / v <= 2):
+        return 0.8
+    return v
+
+
+def _solve(x, K_F, c, sqrt_tau, tol, sigma0, k_max, out, iterations, residual):
+    """ solves each option in a scalar loop in normalised forward space, takes flat ndarrays of size n
+    iterations, residual: written into if they are of size n, see `calcbsimpvol._householder`
+    """
+    diagnose = iterations.shape[0] == out.shape[0]
+    for k in range(out.shape[0]):
+        if not c[k] > 0:
+            out[k] = nan
+            if diagnose:
+                iterations[k] = 0
+                residual[k] = nan
+            continue
+        if SIGMA0_BOUNDS[0] < sigma0[k] < SIGMA0_BOUNDS[1]:
+            v = sigma0[k] * sqrt_tau[k]
+        else:
+            v = _seed(x[k], c[k])
+        iteration = 0
+        while True:
+            d1 = x[k] / v + 0.5 * v
+            d2 = d1 - v
+            e = c[k] - (0.5 * (1. + erf(d1 / sqrt(2.))) - K_F[k] * 0.5 * (1. + erf(d2 / sqrt(2.))))
+            if not abs(e) > tol[k]:
+                break
+            if iteration == k_max:
+                v = nan
+                break
+            vega = exp(-0.5 * d1 * d1) / sqrt(2 * pi)
+            vomma = vega * d1 * d2 / v
+            ultima = -1 * vega * (d1 * d2 * (1 - d1 * d2) + d1 ** 2 + d2 ** 2) / (v ** 2)
+            numerator = 6 * e * vega ** 2 + 3 * e ** 2 * vomma
+            denominator = -6 * vega ** 3 - 6 * e * vega * vomma - e ** 2 * ultima
+            v = v - numerator / denominator
+            iteration = iteration + 1
+        out[k] = v / sqrt_tau[k]
+        if diagnose:
+            iterations[k] = iteration
+            residual[k] = e
+    return out
+
+
+if njit is not None:
+    _fcnv = njit(cache=True, error_model='numpy')(_fcnv)
+    _seed = njit(cache=True, error_model='numpy')(_seed)
+    _solve = njit(cache=True, error_model='numpy', nogil=True)(_solve)
+
+
+def solve(x, K_F, c, sqrt_tau, tol, k_max, out=None, sigma0=None, iterations=None, residual=None):
+    """ entry point of the numba engine, takes the normalised flat ndarrays of `calcbsimpvol._solve_forward`
+    out: float, [n x 1], the result is written into it
+    sigma0: float, [n x 1], initial guess, see `calcbsimpvol._solve`
+    iterations: int, [n x 1], optional, number of iterations of each option is written into it
+    residual: float, [n x 1], optional, c - call(v) at the last iterate of each option is written into it
+
+    Returns:
+        sigma: float, [n x 1]
+
+    """
+    if njit is None:
+        raise ImportError('engine=\'numba\' requires numba: pip install calcbsimpvol[numba]')
+    if sigma0 is None:
+        sigma0 = nan
+    n = np.size(c)
+    args = [np.asarray(arg, dtype=np.float64) for arg in (x, K_F, c, sqrt_tau, tol, sigma0)]
+    # scalars are materialised, numba warns about the read-only views of `np.broadcast_arrays`
+    args = [arg if arg.shape == (n,) else np.ascontiguousarray(np.broadcast_to(arg, (n,))) for arg in args]
+    if out is None:
+        out = np.empty(n)
+    if iterations is None or residual is None:
+        # both or none, numba compiles a single signature
+        iterations = np.empty(0, dtype=np.intp)
+        residual = np.empty(0)
+    return _solve(*args, k_max, out, iterations, residual)
@@ -0,0 +1,80 @@
+"""
+Multi-core solving of large chains
+
+The flat option set is split into cache-sized chunks which are solved concurrently
+in a thread pool. NumPy ufuncs, `scipy.special.erf` and the numba engine release the GIL,
+so the chunks run in parallel. Every option is solved independently of the others,
+hence the result is identical to the serial path.
+
+With a single worker, the chunks bound the memory of the solver: the work buffers are
+of the size of a chunk and reused from chunk to chunk, the result is written into `out`
+chunk by chunk, e.g. into a memory-mapped file.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from threading import local
+
+from numpy import empty, size
+
+from .calcbsimpvol import _size
+from .profiling import _active, _attached
+
+# options per chunk, keeps the work buffers of a chunk within the cache
+CHUNK_SIZE = 2 ** 14
+
+
+def solve_chunked(solve, args, workers=None, chunk_size=None, out=None, **kwargs):
+    """ solves flat ndarrays of size n or 1 chunk by chunk with a pool of `workers` threads
+
+    Args:
+        solve (callable): serial solver, called with the sliced `args` and `work`,
+            a dict of buffers reused by the chunks of the same thread
+        args (list): flat ndarrays of size n or 1
+        workers (int): number of threads, defaults to the number of CPUs
+        chunk_size (int): number of options per chunk, defaults to `CHUNK_SIZE`
+        out (ndarray): float, [n x 1], the result is written into it
+        kwargs: further flat ndarrays of size n or 1 (or `None`), sliced like `args`
+
+    Returns:
+        sigma: float, [n x 1]
+
+    """
+    if workers is None:
+        workers = cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    n = _size(args)
+    if out is None:
+        out = empty(n)
+    buffers = local()
+    # the workers record into the profiles of the calling thread
+    profiles = _active()
+
+    def task(start):
+        stop = min(start + chunk_size, n)
+        work = getattr(buffers, 'work', None)
+        if work is None:
+            work = buffers.work = dict()
+        with _attached(profiles):
+            solve(
+                *[_slice(arg, start, stop) for arg in args],
+                work=work,
+                out=out[start:stop],
+                **{key: _slice(value, start, stop) for key, value in kwargs.items()}
+            )
+
+    if workers == 1:
+        for start in range(0, n, chunk_size):
+            task(start)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # consume the iterator to re-raise exceptions of the workers
+            list(pool.map(task, range(0, n, chunk_size)))
+    return out
+
+
+def _slice(arg, start, stop):
+    """ chunk of a flat ndarray, scalars and `None` are passed on as they are """
+    if arg is None or size(arg) == 1:
+        return arg
+    return arg[start:stop]
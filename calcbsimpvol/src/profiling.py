@@ -0,0 +1,141 @@
+"""
+Opt-in profiling of the solver
+
+Within a `Profile` block every solve reports the wall time of its stages:
+
+* `coercion`: conversion of the inputs into flat ndarrays
+* `forward`: log forward moneyness and discounted forward of each option
+* `normalisation`: mapping onto out-of-the-money calls in normalised forward space, no-arbitrage bounds
+* `seed`: initial guess
+* `iteration`: one Householder iteration (objective, convergence check and update), one record per iteration
+* `solve`: the whole root-finder of the `numba` and `jaeckel` engines, which cannot be split up
+* `greeks`: Greeks of `return_greeks=True`
+* `cache`: lookup of the options in a `ResultCache` (with the number of `hits`) and caching of the solved ones
+
+Each record also holds the number of options processed by the stage (`active`, for the iterations
+the options which were not converged yet) and the bytes of work buffers allocated by it (`allocated`),
+i.e. zero once the buffers of a reused work dict, e.g. of `ImpliedVolSolver`, are warmed up.
+Temporaries allocated by NumPy itself are not counted, use `tracemalloc` for those.
+
+A profile records the solves of the thread which entered it, and of the worker threads these
+solves hand their chunks to (`workers`, `AsyncImpliedVolSolver`), but not the solves which other
+threads run at the same time. Without an active profile each stage costs a single attribute lookup.
+"""
+from contextlib import contextmanager
+from threading import local
+from time import perf_counter
+
+# per thread: `profiles`, the profiles of the `with` blocks entered by (or attached to) the thread,
+# and `allocated`, the bytes of work buffers it allocated while a profile was active
+_state = local()
+
+
+class Profile(object):
+    """
+    records the stages of the solves within a `with` block, including the solves of their worker threads
+
+    Args:
+        callback (callable): called with each record (a dict), e.g. to forward it to a metrics
+            system, the records are not kept in `records` then
+
+    Examples:
+
+    .. code-block:: python
+
+        from calcbsimpvol import calcbsimpvol, Profile
+        with Profile() as profile:
+            sigma = calcbsimpvol(dict(cp=cp, P=P, S=S, K=K, tau=tau, r=r, q=q))
+        profile.records
+        # [{'stage': 'coercion', 'seconds': 2.1e-05, 'active': 20, 'allocated': 0}, ...,
+        #  {'stage': 'iteration', 'seconds': 3.4e-05, 'active': 14, 'allocated': 0, 'iteration': 0}, ...]
+        profile.summary()['seed']
+        # {'calls': 1, 'seconds': 1.8e-05, 'active': 20, 'allocated': 1440}
+
+        with Profile(callback=lambda record: statsd.timing(record['stage'], record['seconds'])):
+            ...
+
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.records = []
+
+    def __enter__(self):
+        _state.profiles = _active() + (self,)
+        return self
+
+    def __exit__(self, *exc_info):
+        _state.profiles = tuple(profile for profile in _active() if profile is not self)
+
+    def record(self, record):
+        if self.callback is None:
+            self.records.append(record)
+        else:
+            self.callback(record)
+
+    def summary(self):
+        """ totals of the records per stage
+
+        Returns:
+            dict: {stage: dict(calls=, seconds=, active=, allocated=)}, `iteration` maps to
+                a list of these totals, one per iteration
+
+        """
+        result = dict()
+        for record in self.records:
+            if record['stage'] == 'iteration':
+                totals = result.setdefault('iteration', [])
+                while len(totals) <= record['iteration']:
+                    totals.append(dict(calls=0, seconds=0., active=0, allocated=0))
+                totals = totals[record['iteration']]
+            else:
+                totals = result.setdefault(record['stage'], dict(calls=0, seconds=0., active=0, allocated=0))
+            totals['calls'] += 1
+            totals['seconds'] += record['seconds']
+            totals['active'] += record['active']
+            totals['allocated'] += record['allocated']
+        return result
+
+
+def _active():
+    """ profiles active in the current thread """
+    return getattr(_state, 'profiles', ())
+
+
+@contextmanager
+def _attached(profiles):
+    """ records the solves of a worker thread into `profiles`, i.e. `_active()` of the thread handing out the work """
+    previous = _active()
+    _state.profiles = profiles
+    try:
+        yield
+    finally:
+        _state.profiles = previous
+
+
+def _start():
+    """ start of a stage, `None` if no profile is active """
+    if not getattr(_state, 'profiles', None):
+        return None
+    return perf_counter(), getattr(_state, 'allocated', 0)
+
+
+def _stop(stage, started, active, **info):
+    """ reports the stage which began at `started` to the active profiles
+    Returns: the start of the next stage
+    """
+    if started is None:
+        return None
+    now = perf_counter()
+    allocated = getattr(_state, 'allocated', 0)
+    record = dict(stage=stage, seconds=now - started[0], active=int(active), allocated=allocated - started[1])
+    record.update(info)
+    for profile in _active():
+        profile.record(record)
+    return now, allocated
+
+
+def _allocated(nbytes):
+    """ counts a newly allocated work buffer """
+    if getattr(_state, 'profiles', None):
+        _state.allocated = getattr(_state, 'allocated', 0) + nbytes
@@ -0,0 +1,143 @@
+from numpy import (
+    asarray, empty, ravel, size, broadcast_to, prod, isnan, logical_and, logical_not, logical_or, not_equal,
+    count_nonzero, take, put, intp, float64
+)
+
+from ..data import FEED_KEYS
+from .calcbsimpvol import _solve, _flat_out, _result_dtype, _buffer, _arange, _positions, _compress
+from .profiling import _start, _stop
+
+
+class ImpliedVolSolver(object):
+    """
+    reusable solver for repeated solves of option chains / surfaces of the same shape.
+    The solver owns the work buffers of the seeding stage and the root-finder, so after the
+    first call (warm-up) repeated solves do not allocate any arrays of the size of the chain,
+    especially if the result is written into a preallocated `out` array.
+
+    With `incremental=True` only the options whose inputs changed since the previous solve are
+    solved again, warm-started from their previous implied volatility.
+
+    Args:
+        shape (tuple): shape of the option price matrix, i.e. (m, n) or (n,)
+        engine (str): 'numpy' (default), 'numba' or 'jaeckel', see `calcbsimpvol`
+        seed (str): initial guess, 'rational' (default) or 'table', see `calcbsimpvol`
+        dtype: float64 (default) or float32, see `calcbsimpvol`
+        refine (bool): refine a float32 solution in float64, see `calcbsimpvol`
+        tol (float): tolerance on the option price, see `calcbsimpvol`
+        max_iter (int): maximum number of iterations, see `calcbsimpvol`
+
+    Examples:
+
+    .. code-block:: python
+
+        from calcbsimpvol import ImpliedVolSolver
+        solver = ImpliedVolSolver(P.shape)
+        sigma = np.empty(P.shape)
+        while True:
+            # P, K, tau, ... updated in place by the feed
+            solver.solve(dict(cp=cp, P=P, S=S, K=K, tau=tau, r=r, q=q), out=sigma, incremental=True)
+
+    """
+    feed_keys = FEED_KEYS
+
+    def __init__(self, shape, engine='numpy', seed='rational', dtype=float64, refine=False, tol=1e-12, max_iter=10):
+        self.shape = tuple(shape) if hasattr(shape, '__len__') else (shape,)
+        self.size = int(prod(self.shape))
+        self.engine = engine
+        self.seed = seed
+        self.dtype = dtype
+        self.refine = refine
+        self.result_dtype = _result_dtype(dtype, refine)
+        self.tol = tol
+        self.max_iter = max_iter
+        self._work = dict()
+        # inputs and result of the previous solve, used by the incremental mode
+        self._inputs = None
+        self._sigma = None
+        # buffers of the incremental mode, kept apart from the ones of the solver
+        self._changes = dict()
+
+    def solve(self, arg_dict, out=None, sigma0=None, incremental=False):
+        """
+        Args:
+            arg_dict(dict): cp, P, S, K, tau, r, q, each of `shape` or a scalar,
+                see `calcbsimpvol`
+            out (ndarray): float...C-contiguous array of `shape` and `result_dtype` the result is written into
+            sigma0 (ndarray): float...initial guess of `shape`, see `calcbsimpvol`
+            incremental (bool): re-solve only the options whose price, spot, rate or any other input
+                changed since the previous solve, starting from their previous implied volatility.
+                The other options keep their previous result. `sigma0` is not used in this mode.
+
+        Returns:
+            - **iv** (ndarray) – float...The Implied Volatility...of `shape`
+
+        """
+        started = _start()
+        args = [self._flatten(arg_dict[key]) for key in self.feed_keys]
+        if out is None:
+            out = empty(self.shape, dtype=self.result_dtype)
+        flat_out = _flat_out(out, self.size, self.result_dtype)
+        _stop('coercion', started, self.size)
+        if incremental and self._sigma is not None:
+            self._update(args, flat_out)
+        else:
+            if sigma0 is not None:
+                sigma0 = self._flatten(sigma0)
+            _solve(
+                *args, engine=self.engine, work=self._work, out=flat_out, sigma0=sigma0, seed=self.seed,
+                dtype=self.dtype, refine=self.refine, tol=self.tol, max_iter=self.max_iter
+            )
+        self._store(args, flat_out)
+        return out
+
+    def _update(self, args, out):
+        """ solves the options with changed inputs, warm-started from the previous result """
+        work = self._changes
+        n = self.size
+        changed = _buffer(work, 'changed', n, dtype=bool)
+        differs = _buffer(work, 'differs', n, dtype=bool)
+        both_nan = _buffer(work, 'both_nan', n, dtype=bool)
+        previous_nan = _buffer(work, 'previous_nan', n, dtype=bool)
+        changed[...] = False
+        for arg, previous in zip(args, self._inputs):
+            not_equal(arg, previous, out=differs)
+            # NaN != NaN, a quote which stays NaN is not changed
+            logical_and(isnan(arg, out=both_nan), isnan(previous, out=previous_nan), out=both_nan)
+            logical_and(differs, logical_not(both_nan, out=both_nan), out=differs)
+            logical_or(changed, differs, out=changed)
+        out[...] = self._sigma
+        m = count_nonzero(changed)
+        if not m:
+            return
+        # the changed options are gathered into the buffers instead of being copied by fancy indexing, in the dtype
+        # of each input (a cast would copy e.g. an integer `cp`) and by `take`, `put` copies read-only inputs
+        index = _compress(_positions(changed, work), m, _arange(work, n), _buffer(work, 'index', n, dtype=intp))
+        sigma = _solve(
+            *[arg if size(arg) == 1 else take(arg, index, out=_buffer(work, key, m, dtype=arg.dtype), mode='clip')
+              for key, arg in zip(self.feed_keys, args)],
+            engine=self.engine, work=self._work, out=_buffer(work, 'sigma', m, dtype=self.result_dtype),
+            sigma0=take(self._sigma, index, out=_buffer(work, 'sigma0', m), mode='clip'), seed=self.seed,
+            dtype=self.dtype, refine=self.refine, tol=self.tol, max_iter=self.max_iter
+        )
+        put(out, index, sigma)
+
+    def _store(self, args, out):
+        """ keeps a copy of the inputs and the result for the next incremental solve """
+        if self._sigma is None:
+            self._sigma = empty(self.size)
+        # in the dtype of each input, comparing e.g. an integer `cp` with floats would allocate
+        self._inputs = [
+            _buffer(self._changes, 'previous ' + key, self.size, dtype=arg.dtype)
+            for key, arg in zip(self.feed_keys, args)
+        ]
+        for arg, previous in zip(args, self._inputs):
+            previous[...] = arg
+        self._sigma[...] = out
+
+    def _flatten(self, arg):
+        """ flat view on `arg`, scalars are left as [1 x 1] """
+        arg = asarray(arg)
+        if size(arg) == 1:
+            return ravel(arg)
+        return ravel(broadcast_to(arg, self.shape))
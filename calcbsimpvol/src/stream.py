@@ -0,0 +1,141 @@
+"""
+Streaming solves of option chains larger than memory
+
+`solve_stream` consumes an iterator of batches, i.e. dicts of the inputs of `calcbsimpvol_flat`,
+and yields the implied volatilities batch by batch. The batches are produced in a background
+thread while the previous one is solved, so reading / parsing the input overlaps with the
+solver, and only `prefetch` batches are buffered at a time. The work buffers of the solver
+are reused from batch to batch.
+"""
+from queue import Queue, Full
+from threading import Event, Thread
+
+from numpy import asarray, broadcast_to, concatenate, float64, size
+
+from ..data import FEED_KEYS
+from .calcbsimpvol import _solve
+
+# marks the end of the batches in the queue of `_prefetch`
+_DONE = object()
+
+
+def solve_stream(batches, batch_size=None, prefetch=2, engine='numpy', workers=1, seed='rational', dtype=float64,
+                 refine=False, tol=1e-12, max_iter=10, cache=None):
+    """
+    solves a stream of option batches, e.g. the days of a history archive or the messages of a feed
+
+    Args:
+        batches (iterable): dicts with (at least) the keys cp, P, S, K, tau, r, q, each a 1-D array
+            or a scalar, see `calcbsimpvol_flat`. Further keys, e.g. labels, are passed through,
+            all batches need the same keys.
+        batch_size (int): number of options per solve, the batches are split or merged accordingly,
+            by default each batch is solved as it comes
+        prefetch (int): number of batches read ahead in a background thread, 0 reads them in the
+            calling thread
+        engine, workers, seed, dtype, refine, tol, max_iter, cache: see `calcbsimpvol_flat`
+
+    Yields:
+        (batch, sigma): the batch as a dict of flat arrays of the same length and its implied volatility
+
+    Examples:
+
+    .. code-block:: python
+
+        from calcbsimpvol import solve_stream
+        from calcbsimpvol.data.loader import iter_days
+        batches = (dict(fields, day=day) for day, fields in iter_days('cl_20171115'))
+        for batch, sigma in solve_stream(batches, batch_size=2 ** 14):
+            store(batch['day'], batch['K'], sigma)
+
+    """
+    if batch_size is not None and batch_size < 1:
+        raise ValueError('batch_size must be positive')
+    work = dict()
+    for batch in _prefetch(_rebatch(batches, batch_size), prefetch):
+        sigma = _solve(
+            *[batch[key] for key in FEED_KEYS], engine=engine, workers=workers, work=work, seed=seed,
+            dtype=dtype, refine=refine, tol=tol, max_iter=max_iter, cache=cache
+        )
+        yield batch, sigma
+
+
+def _flat_batch(batch):
+    """ flat arrays of a batch, scalars are broadcast to its length without being copied """
+    # array methods instead of the module functions, the batches of a feed may be tiny
+    batch = {key: asarray(value).reshape(-1) for key, value in batch.items()}
+    # an empty batch stays empty with scalar fields
+    sizes = set(value.shape[0] for value in batch.values() if value.shape[0] != 1)
+    if len(sizes) > 1:
+        raise ValueError('the fields of a batch must be scalars or arrays of the same length, got {}'.format(sorted(sizes)))
+    n = sizes.pop() if sizes else 1
+    return {key: value if value.shape[0] == n else broadcast_to(value, (n,)) for key, value in batch.items()}
+
+
+def _rebatch(batches, batch_size=None):
+    """ splits and merges the batches into batches of `batch_size` options, the last one may be shorter """
+    pending = []
+    n_pending = 0
+    for batch in batches:
+        batch = _flat_batch(batch)
+        if batch_size is None:
+            yield batch
+            continue
+        pending.append(batch)
+        n_pending += size(batch['P'])
+        while n_pending >= batch_size:
+            merged = _merge(pending)
+            yield {key: value[:batch_size] for key, value in merged.items()}
+            pending = [{key: value[batch_size:] for key, value in merged.items()}]
+            n_pending -= batch_size
+    if n_pending:
+        yield _merge(pending)
+
+
+def _merge(batches):
+    if len(batches) == 1:
+        return batches[0]
+    return {key: concatenate([batch[key] for batch in batches]) for key in batches[0]}
+
+
+def _prefetch(iterable, prefetch):
+    """ iterates over `iterable` in a background thread, `prefetch` items ahead """
+    if not prefetch:
+        for item in iterable:
+            yield item
+        return
+    queue = Queue(maxsize=prefetch)
+    stop = Event()
+
+    def put(item):
+        # gives up once the consumer is gone
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as error:
+            put((_DONE, error))
+            return
+        put((_DONE, None))
+
+    thread = Thread(target=produce, name='calcbsimpvol-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = queue.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # the thread may be blocked in `iterable`, it ends with its next item
+        stop.set()
@@ -0,0 +1,141 @@
+"""
+Tabulated initial guess, selected with ``seed='table'``
+
+The normalised volatility v = sigma * sqrt(tau) of an out-of-the-money call is tabulated on a
+regular grid over x = log(F / K) <= 0 and u = log(c), c being the normalised call price. The grid
+values are exact implied volatilities from `jaeckel.normalised_implied_volatility`.
+The table is built once per process, or loaded from (and saved to) a ``.npy`` file, see `get`.
+
+Seeding is a bilinear interpolation, i.e. a handful of array operations instead of the
+rational function of Li (2006), and covers a domain well beyond its Domain-of-Approximation.
+Options outside of the grid fall back to `calcbsimpvol._seed`.
+"""
+import os
+
+import numpy as np
+
+from .calcbsimpvol import _buffer, _positions, _compress, _seed
+
+X_MIN = -4.
+X_MAX = 0.
+X_NODES = 161
+U_MIN = -32.
+U_MAX = -0.01
+U_NODES = 321
+
+_DX = (X_MAX - X_MIN) / (X_NODES - 1)
+_DU = (U_MAX - U_MIN) / (U_NODES - 1)
+
+_table = None
+
+
+def build():
+    """ computes the table, v at the nodes, [X_NODES x U_NODES] """
+    from .jaeckel import normalised_implied_volatility
+    x, u = np.meshgrid(np.linspace(X_MIN, X_MAX, X_NODES), np.linspace(U_MIN, U_MAX, U_NODES), indexing='ij')
+    # c is normalised by the forward, beta by sqrt(F * K) = F * exp(-x / 2)
+    return normalised_implied_volatility(np.exp(u + 0.5 * x), x)
+
+
+def get(path=None):
+    """ the table, built on first use and kept for the lifetime of the process
+    path (str): optional `.npy` file, the table is loaded from it or saved to it if it does not exist yet
+    """
+    global _table
+    if _table is not None:
+        return _table
+    table = None
+    if path is not None and os.path.exists(path):
+        table = np.load(path)
+        if np.shape(table) != (X_NODES, U_NODES):
+            table = None
+    if table is None:
+        table = build()
+        if path is not None:
+            np.save(path, table)
+    table.setflags(write=False)
+    _table = table
+    return table
+
+
+def seed(x, c, work=None, out=None):
+    """ initial guess of the normalised volatility, interpolated in the table, see `calcbsimpvol._seed`
+    x: float, log forward moneyness, x <= 0, [n x 1]
+    c: float, normalised call price, [n x 1]
+    """
+    if work is None:
+        work = dict()
+    n = np.size(x)
+    v = np.empty(n) if out is None else out
+    table = get()
+    if v.dtype != table.dtype:
+        # e.g. float32, kept in `work` so that the table is not cast on every call
+        if work.get('table_cast') is None or work['table_cast'].dtype != v.dtype:
+            work['table_cast'] = table.astype(v.dtype)
+        table = work['table_cast']
+    table = table.ravel()
+
+    # fractional grid coordinates and the weights of the upper neighbours
+    fx = _buffer(work, 'table_fx', n)
+    fu = _buffer(work, 'table_fu', n)
+    np.subtract(x, X_MIN, out=fx)
+    np.multiply(fx, 1. / _DX, out=fx)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.log(c, out=fu)
+    np.subtract(fu, U_MIN, out=fu)
+    np.multiply(fu, 1. / _DU, out=fu)
+
+    outside = _buffer(work, 'table_outside', n, dtype=bool)
+    bound = _buffer(work, 'table_bound', n, dtype=bool)
+    np.greater_equal(fx, 0, out=outside)
+    np.greater_equal(fu, 0, out=bound)
+    np.logical_and(outside, bound, out=outside)
+    np.less_equal(fu, U_NODES - 1, out=bound)
+    np.logical_and(outside, bound, out=outside)
+    np.logical_not(outside, out=outside)
+
+    i = _buffer(work, 'table_i', n)
+    j = _buffer(work, 'table_j', n)
+    np.floor(fx, out=i)
+    np.clip(i, 0, X_NODES - 2, out=i)
+    np.floor(fu, out=j)
+    np.clip(j, 0, U_NODES - 2, out=j)
+    np.subtract(fx, i, out=fx)
+    np.subtract(fu, j, out=fu)
+
+    # flat index of the lower left neighbour
+    np.multiply(i, U_NODES, out=i)
+    np.add(i, j, out=i)
+    idx = _buffer(work, 'table_idx', n, dtype=np.intp)
+    with np.errstate(invalid='ignore'):
+        np.copyto(idx, i, casting='unsafe')
+
+    # v = (1 - wu) * ((1 - wx) * v00 + wx * v10) + wu * ((1 - wx) * v01 + wx * v11)
+    lower = _buffer(work, 'table_lower', n)
+    upper = _buffer(work, 'table_upper', n)
+    corner = _buffer(work, 'table_corner', n)
+    np.take(table, idx, out=lower, mode='clip')
+    np.add(idx, U_NODES, out=idx)
+    np.take(table, idx, out=corner, mode='clip')
+    np.subtract(corner, lower, out=corner)
+    np.multiply(corner, fx, out=corner)
+    np.add(lower, corner, out=lower)
+    np.add(idx, 1, out=idx)
+    np.take(table, idx, out=upper, mode='clip')
+    np.subtract(idx, U_NODES, out=idx)
+    np.take(table, idx, out=corner, mode='clip')
+    np.subtract(upper, corner, out=upper)
+    np.multiply(upper, fx, out=upper)
+    np.add(upper, corner, out=upper)
+    np.subtract(upper, lower, out=upper)
+    np.multiply(upper, fu, out=upper)
+    np.add(lower, upper, out=v)
+
+    # outside of the grid, e.g. far out-of-the-money, NaN or c >= exp(U_MAX)
+    m = np.count_nonzero(outside)
+    if m:
+        positions = _positions(outside, work)
+        x_d = _compress(positions, m, x, _buffer(work, 'table_x', n))
+        c_d = _compress(positions, m, c, _buffer(work, 'table_c', n))
+        np.place(v, outside, _seed(x_d, c_d, work, out=_buffer(work, 'table_v', m)))
+    return v
@@ -0,0 +1,74 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from calcbsimpvol import AsyncImpliedVolSolver, Profile, calcbsimpvol_flat
+from calcbsimpvol.benchmarks.chains import synthetic_chain
+
+
+def run(coroutine):
+    """ `asyncio.run` of Python 3.7 """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def requests(n, k=5):
+    args, _ = synthetic_chain(n * k)
+    return [{key: value[i * k:(i + 1) * k] for key, value in args.items()} for i in range(n)]
+
+
+def test_requests_are_coalesced():
+    batch = requests(200)
+
+    async def main():
+        async with AsyncImpliedVolSolver(window=0.01) as solver:
+            return await asyncio.gather(*[solver.implied_vol(**request) for request in batch])
+
+    with Profile() as profile:
+        results = run(main())
+    assert profile.summary()['forward']['calls'] == 1
+    for request, sigma in zip(batch, results):
+        np.testing.assert_array_equal(sigma, calcbsimpvol_flat(**request))
+
+
+def test_max_batch():
+    batch = requests(4)
+
+    async def main():
+        # the window would outlast the test, full batches are solved right away
+        solver = AsyncImpliedVolSolver(window=60, max_batch=10)
+        results = await asyncio.wait_for(
+            asyncio.gather(*[solver.implied_vol(**request) for request in batch]), timeout=5
+        )
+        await solver.close()
+        return results
+
+    with Profile() as profile:
+        results = run(main())
+    assert profile.summary()['forward']['calls'] == 2
+    assert [len(sigma) for sigma in results] == [5, 5, 5, 5]
+
+
+def test_scalars_and_errors():
+    async def main():
+        async with AsyncImpliedVolSolver() as solver:
+            sigma = await solver.implied_vol(cp=1, P=10.4506, S=100., K=100., tau=1., r=0.05, q=0.)
+            assert pytest.approx(sigma, abs=1e-4) == [0.2]
+            with pytest.raises(ValueError):
+                await solver.implied_vol(cp=1, P=[10., 11.], S=100., K=[100., 110., 120.], tau=1., r=0.05, q=0.)
+            # an empty request is answered right away, it cannot fail the batch of the others
+            empty = solver.implied_vol(cp=1, P=[], S=100., K=[], tau=1., r=0.05, q=0.)
+            sigma, nothing = await asyncio.gather(
+                solver.implied_vol(cp=1, P=10.4506, S=100., K=100., tau=1., r=0.05, q=0.), empty
+            )
+            assert pytest.approx(sigma, abs=1e-4) == [0.2]
+            assert nothing.shape == (0,)
+        async with AsyncImpliedVolSolver(engine='unknown') as solver:
+            with pytest.raises(ValueError):
+                await solver.implied_vol(cp=1, P=10.4506, S=100., K=100., tau=1., r=0.05, q=0.)
+
+    run(main())
@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+import pytest
+
+from calcbsimpvol import calcbsimpvol_flat, data
+from calcbsimpvol.benchmarks import run, synthetic_chain
+
+
+def test_synthetic_chain():
+    args, _ = synthetic_chain(1000)
+    sigma = calcbsimpvol_flat(engine='jaeckel', **args)
+    # a few deep in-the-money options have no time value left in float64
+    assert np.isfinite(sigma).mean() > 0.99
+    sigma = sigma[np.isfinite(sigma)]
+    assert ((0.1 - 1e-8 <= sigma) & (sigma <= 0.6 + 1e-8)).all()
+
+
+def test_load():
+    for name in data.DATASETS:
+        days = data.load(name)
+        for day in days:
+            assert all(key in days[day] for key in data.FEED_KEYS)
+    with pytest.raises(ValueError):
+        data.path('unknown')
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'numba'])
+def test_run(engine):
+    if engine == 'numba':
+        pytest.importorskip('numba')
+    report = run(sizes=[1, 100], datasets=['cl_20171115'], engines=[engine], repeat=1)
+    json.dumps(report)
+    assert [result['case'] for result in report['results']] == ['cl_20171115', 'synthetic_1', 'synthetic_100']
+    for result in report['results']:
+        assert result['options_per_second'] > 0
+        assert result['peak_bytes'] > 0
+        stages = result['stages']
+        assert stages['coercion']['calls'] == result['solves']
+        assert stages['normalisation']['active'] == result['options']
+        if engine == 'numpy':
+            assert stages['seed']['active'] == result['options']
+            assert stages['iteration'][0]['active'] == result['options']
+            assert 0 < len(stages['iteration']) <= 11
+        else:
+            assert stages['solve']['active'] == result['options']
+            assert 'iteration' not in stages
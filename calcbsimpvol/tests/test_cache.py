@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from calcbsimpvol import ResultCache, Profile, calcbsimpvol, calcbsimpvol_flat, calcbsimpvol_black76, solve_stream
+from calcbsimpvol.benchmarks.chains import synthetic_chain
+
+
+def test_hits_and_misses():
+    args, _ = synthetic_chain(1000)
+    cache = ResultCache()
+    expected = calcbsimpvol_flat(**args)
+    np.testing.assert_array_equal(calcbsimpvol_flat(**dict(args, cache=cache)), expected)
+    assert (cache.hits, cache.misses, len(cache)) == (0, 1000, 1000)
+
+    with Profile() as profile:
+        sigma = calcbsimpvol_flat(**dict(args, cache=cache))
+    np.testing.assert_array_equal(sigma, expected)
+    assert (cache.hits, cache.misses) == (1000, 1000)
+    assert 'forward' not in profile.summary()
+
+    # a tick of some prices, only these are solved
+    ticked = dict(args, P=args['P'].copy())
+    ticked['P'][::10] *= 1.001
+    np.testing.assert_array_equal(calcbsimpvol_flat(**dict(ticked, cache=cache)), calcbsimpvol_flat(**ticked))
+    assert (cache.hits, cache.misses, len(cache)) == (1900, 1100, 1100)
+
+
+def test_quantisation():
+    args, _ = synthetic_chain(100)
+    nudged = dict(args, P=args['P'] * (1 + 1e-14))
+    cache = ResultCache(digits=12)
+    calcbsimpvol_flat(**dict(args, cache=cache))
+    calcbsimpvol_flat(**dict(nudged, cache=cache))
+    # a price close to the edge of its rounding interval may be nudged into the next one
+    assert cache.hits >= 95
+    cache = ResultCache(digits=16)
+    calcbsimpvol_flat(**dict(args, cache=cache))
+    calcbsimpvol_flat(**dict(nudged, cache=cache))
+    assert cache.hits == 0
+
+
+def test_lru_eviction():
+    args, _ = synthetic_chain(15)
+    first = {key: value[:10] for key, value in args.items()}
+    recent = {key: value[:5] for key, value in args.items()}
+    new = {key: value[10:] for key, value in args.items()}
+    cache = ResultCache(max_size=10)
+    calcbsimpvol_flat(**dict(first, cache=cache))
+    calcbsimpvol_flat(**dict(recent, cache=cache))
+    calcbsimpvol_flat(**dict(new, cache=cache))
+    assert (len(cache), cache.evictions) == (10, 5)
+    calcbsimpvol_flat(**dict(first, cache=cache))
+    # the options 0 to 4 were used more recently than 5 to 9
+    assert (cache.hits, cache.misses) == (5 + 5, 10 + 5 + 5)
+
+
+def test_colliding_hashes():
+    args, _ = synthetic_chain(50)
+    cache = ResultCache()
+    cache._hash_keys = lambda keys, n: np.zeros(n, dtype=np.uint64)
+    calcbsimpvol_flat(**dict(args, cache=cache))
+    assert len(cache) == 1
+    sigma = calcbsimpvol_flat(**dict(args, cache=cache))
+    assert cache.hits == 1
+    np.testing.assert_array_equal(sigma, calcbsimpvol_flat(**args))
+
+
+def test_surface_and_stream():
+    args, _ = synthetic_chain(20)
+    surface = {key: value.reshape(4, 5) for key, value in args.items()}
+    cache = ResultCache()
+    np.testing.assert_array_equal(calcbsimpvol(surface, cache=cache), calcbsimpvol(surface))
+    results = [sigma for _, sigma in solve_stream([args, args], cache=cache)]
+    np.testing.assert_array_equal(results[1], calcbsimpvol_flat(**args))
+    assert cache.hits == 40
+    with pytest.raises(ValueError):
+        calcbsimpvol_flat(**dict(args, cache=cache, diagnostics=True))
+
+
+def test_black76():
+    args, _ = synthetic_chain(100)
+    F = args['S'] * np.exp((args['r'] - args['q']) * args['tau'])
+    black76 = dict(cp=args['cp'], P=args['P'], F=F, K=args['K'], tau=args['tau'], DF=np.exp(-args['r'] * args['tau']))
+    cache = ResultCache()
+    expected = calcbsimpvol_black76(**black76)
+    np.testing.assert_array_equal(calcbsimpvol_black76(**dict(black76, cache=cache)), expected)
+    result = calcbsimpvol_black76(**dict(black76, cache=cache, return_greeks=True))
+    np.testing.assert_array_equal(result['iv'], expected)
+    assert (cache.hits, cache.misses) == (100, 100)
+    # the options of Black-76 and of a spot are not mixed
+    with pytest.raises(ValueError):
+        calcbsimpvol_flat(**dict(args, cache=cache))
+    with pytest.raises(ValueError):
+        calcbsimpvol_black76(**dict(black76, cache=cache, diagnostics=True))
@@ -0,0 +1,348 @@
+import numpy as np
+import pytest
+from calcbsimpvol import calcbsimpvol, calcbsimpvol_flat, calcbsimpvol_black76
+from calcbsimpvol import CONVERGED, BELOW_INTRINSIC, ABOVE_UPPER_BOUND, OUTSIDE_DOMAIN, NOT_CONVERGED, REASONS
+from calcbsimpvol.src.calcbsimpvol import _solve, _greeks
+from calcbsimpvol.src.parallel import solve_chunked
+from calcbsimpvol.benchmarks.chains import synthetic_chain, black_scholes
+from calcbsimpvol.tests.test_examples import expected_result_example_2, MOE
+
+
+def example_2_inputs():
+    P = np.asarray([
+        [59.14, 34.21, 10.17, 16.12, 40.58],
+        [58.43, 33.59, 10.79, 17.47, 41.15],
+        [57.87, 33.16, 11.363, 18.63, 41.74],
+        [57.44, 32.91, 11.90, 19.58, 42.27]
+    ])
+    K, tau = np.meshgrid(np.arange(40, 160, 25), np.arange(0.25, 1.01, 0.25))
+    cp = np.hstack((np.ones((4, 3)), -1 * np.ones((4, 2))))
+    r = 0.01 * np.ones((4, 5)) * np.asarray([1.15, 1.10, 1.05, 1]).reshape((4, 1))
+    q = 0.03 * np.ones((4, 5)) * np.asarray([1.3, 1.2, 1.1, 1]).reshape((4, 1))
+    return dict(cp=cp, P=P, S=np.asarray(100), K=K, tau=tau, r=r, q=q)
+
+
+def test_flat_matches_matrix():
+    args = example_2_inputs()
+    flat = {key: np.ravel(value) for key, value in args.items()}
+    sigma = calcbsimpvol_flat(**flat)
+    assert sigma.shape == (20,)
+    assert pytest.approx(sigma, abs=MOE, nan_ok=True) == np.ravel(expected_result_example_2)
+
+
+def test_flat_ragged_chain():
+    # two expiries with a different set of strikes each
+    K = np.asarray([90., 100., 110., 95., 100., 105., 120.])
+    tau = np.asarray([0.25, 0.25, 0.25, 1., 1., 1., 1.])
+    P = np.asarray([11.72, 4.62, 1.13, 12.89, 8.91, 6.89, 3.16])
+    sigma = calcbsimpvol_flat(cp=1, P=P, S=100, K=K, tau=tau, r=0.01, q=0.02)
+    for k in range(np.size(P)):
+        single = calcbsimpvol_flat(cp=1, P=P[k], S=100, K=K[k], tau=tau[k], r=0.01, q=0.02)
+        assert single.shape == (1,)
+        assert single[0] == pytest.approx(sigma[k], abs=1e-12)
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(), dict(engine='numba'), dict(engine='jaeckel'), dict(dtype=np.float32), dict(workers=2),
+    dict(chunk_size=4), dict(return_greeks=True), dict(diagnostics=True),
+])
+def test_empty_chain(kwargs):
+    # the scalars are broadcast against the empty prices
+    result = calcbsimpvol_flat(cp=1, P=np.empty(0), S=100., K=100., tau=1., r=0.01, q=0., **kwargs)
+    for value in (result.values() if isinstance(result, dict) else [result]):
+        assert value.shape == (0,)
+
+
+def test_empty_chain_black76_and_matrix():
+    assert calcbsimpvol_black76(cp=1, P=np.empty(0), F=100., K=100., tau=1., DF=1.).shape == (0,)
+    args = dict(cp=1, P=np.empty((0, 3)), S=100., K=100., tau=1., r=0.01, q=0.)
+    assert calcbsimpvol(args).shape == (0, 3)
+
+
+def test_per_option_underlying():
+    # the same chain quoted on two underlyings (scaled by 2) and solved in one call
+    args = example_2_inputs()
+    S = np.vstack((100 * np.ones((4, 5)), 200 * np.ones((4, 5))))
+    both = dict(
+        cp=np.vstack((args['cp'], args['cp'])),
+        P=np.vstack((args['P'], 2 * args['P'])),
+        S=S,
+        K=np.vstack((args['K'], 2 * args['K'])),
+        tau=np.vstack((args['tau'], args['tau'])),
+        r=np.vstack((args['r'], args['r'])),
+        q=np.vstack((args['q'], args['q'])),
+    )
+    sigma = calcbsimpvol(both)
+    assert pytest.approx(sigma[:4], abs=MOE, nan_ok=True) == expected_result_example_2
+    assert pytest.approx(sigma[4:], abs=MOE, nan_ok=True) == calcbsimpvol(example_2_inputs())
+    flat = calcbsimpvol_flat(*[np.ravel(both[key]) for key in ['cp', 'P', 'S', 'K', 'tau', 'r', 'q']])
+    assert pytest.approx(flat, abs=1e-12, nan_ok=True) == np.ravel(sigma)
+
+
+# numba warns about writing into read-only broadcast views
+@pytest.mark.filterwarnings('error')
+def test_numba_engine():
+    pytest.importorskip('numba')
+    args = example_2_inputs()
+    sigma = calcbsimpvol(args, engine='numba')
+    assert pytest.approx(sigma, abs=MOE, nan_ok=True) == expected_result_example_2
+    flat = {key: np.ravel(value) for key, value in args.items()}
+    assert pytest.approx(calcbsimpvol_flat(engine='numba', **flat), abs=1e-10, nan_ok=True) == \
+        calcbsimpvol_flat(engine='numpy', **flat)
+    warm = calcbsimpvol_flat(engine='numba', sigma0=np.ravel(sigma), **flat)
+    assert pytest.approx(warm, abs=1e-10, nan_ok=True) == np.ravel(sigma)
+
+
+def test_black76_recovers_sigma():
+    args, sigma = synthetic_chain(1000, seed=1)
+    F = args['S'] * np.exp((args['r'] - args['q']) * args['tau'])
+    DF = np.exp(-args['r'] * args['tau'])
+    iv = calcbsimpvol_black76(args['cp'], args['P'], F, args['K'], args['tau'], DF)
+    # a few deep in-the-money options have no vega left at the price tolerance
+    valid = np.isfinite(iv)
+    assert np.mean(valid) > 0.99
+    assert pytest.approx(iv[valid], abs=1e-6) == sigma[valid]
+    flat = calcbsimpvol_flat(*[args[key] for key in ['cp', 'P', 'S', 'K', 'tau', 'r', 'q']])
+    assert pytest.approx(iv, abs=1e-8, nan_ok=True) == flat
+
+
+def test_black76_futures_option():
+    # options on a futures contract: S = F and r = q, so that F is not drifted
+    args = example_2_inputs()
+    r = args['r']
+    flat = calcbsimpvol_flat(*[np.ravel(value) for value in (args['cp'], args['P'], 100, args['K'], args['tau'], r, r)])
+    iv = calcbsimpvol_black76(
+        np.ravel(args['cp']), np.ravel(args['P']), 100, np.ravel(args['K']), np.ravel(args['tau']),
+        np.ravel(np.exp(-r * args['tau']))
+    )
+    assert pytest.approx(iv, abs=1e-12, nan_ok=True) == flat
+
+
+def test_black76_greeks():
+    # options on futures are options on a spot with q = r, except for rho, which moves F with r
+    args, _ = synthetic_chain(200)
+    cp, P, K, tau, r = [args[key] for key in ['cp', 'P', 'K', 'tau', 'r']]
+    F = args['S'] * np.exp((r - args['q']) * tau)
+    result = calcbsimpvol_black76(cp, P, F, K, tau, np.exp(-r * tau), return_greeks=True)
+    spot = calcbsimpvol_flat(cp, P, F, K, tau, r, r, return_greeks=True)
+    ok = ~np.isnan(result['iv'])
+    assert np.sum(ok) > 190
+    for key in ['iv', 'delta', 'gamma', 'vega', 'theta', 'vanna', 'volga']:
+        assert pytest.approx(result[key][ok], rel=1e-8, abs=1e-10) == spot[key][ok]
+    assert pytest.approx(result['rho'][ok], rel=1e-8, abs=1e-10) == -tau[ok] * P[ok]
+
+
+def test_deep_out_of_the_money_puts():
+    S, tau, r, q, sigma = 100., 0.25, 0.02, 0.01, 0.3
+    K = S * np.exp(np.linspace(-0.7, -0.2, 50))
+    P = black_scholes(-1, S, K, tau, r, q, sigma)
+    assert P.min() < 1e-4
+    iv = calcbsimpvol_flat(-1, P, S, K, tau, r, q)
+    assert pytest.approx(iv, abs=1e-6) == sigma * np.ones(50)
+    # the mirrored calls, quoted in units of the strike
+    F = S * np.exp((r - q) * tau)
+    mirrored = calcbsimpvol_black76(1, F * P / K, F, F ** 2 / K, tau, np.exp(-r * tau))
+    assert pytest.approx(mirrored, abs=1e-6) == iv
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'numba'])
+def test_no_time_value(engine):
+    if engine == 'numba':
+        pytest.importorskip('numba')
+    # a zero priced call and puts at and below the intrinsic value
+    cp = np.asarray([1, -1, -1, 1])
+    P = np.asarray([0., 1.2, 45., 1.2])
+    K = np.asarray([145., 145., 145., 145.])
+    tau = np.asarray([0.01, 0.01, 0.01, 0.01])
+    iv = calcbsimpvol_flat(cp, P, 100., K, tau, 0., 0., engine=engine)
+    assert np.isnan(iv[:3]).all()
+    assert np.isfinite(iv[3])
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        calcbsimpvol(example_2_inputs(), engine='fortran')
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'numba', 'jaeckel'])
+def test_diagnostics(engine):
+    if engine == 'numba':
+        pytest.importorskip('numba')
+    # a valid call and put, a call below its intrinsic value, a put above DF * K, a NaN price and tau = 0
+    cp = np.asarray([1, -1, 1, -1, 1, 1])
+    P = np.asarray([5.2, 4.1, 14., 125., np.nan, 5.2])
+    K = np.asarray([105., 95., 85., 120., 105., 105.])
+    tau = np.asarray([0.5, 0.5, 0.5, 0.5, 0.5, 0.])
+    result = calcbsimpvol_flat(cp, P, 100., K, tau, 0.01, 0., engine=engine, diagnostics=True)
+    np.testing.assert_array_equal(result['reason'], [
+        CONVERGED, CONVERGED, BELOW_INTRINSIC, ABOVE_UPPER_BOUND, OUTSIDE_DOMAIN, OUTSIDE_DOMAIN
+    ])
+    assert np.isfinite(result['iv'][:2]).all()
+    assert np.isnan(result['iv'][2:]).all()
+    assert (result['iterations'][:2] > 0).all()
+    # the quotes outside of the bounds are not iterated
+    assert (result['iterations'][2:] == 0).all()
+    assert (np.absolute(result['residual'][:2]) <= 1e-12).all()
+    np.testing.assert_array_equal(result['iv'], calcbsimpvol_flat(cp, P, 100., K, tau, 0.01, 0., engine=engine))
+
+
+def test_tol_max_iter():
+    args = example_2_inputs()
+    result = calcbsimpvol(args, diagnostics=True, return_greeks=True)
+    assert set(result) >= {'iv', 'delta', 'iterations', 'residual', 'reason'}
+    assert result['reason'].shape == (4, 5)
+    valid = result['reason'] == CONVERGED
+    np.testing.assert_array_equal(valid, np.isfinite(result['iv']))
+    # a looser tolerance needs fewer iterations, no iterations at all turn everything but a hit into NaN
+    loose = calcbsimpvol(args, diagnostics=True, tol=1e-4)
+    assert (loose['iterations'] <= result['iterations']).all()
+    assert loose['iterations'].sum() < result['iterations'].sum()
+    assert (np.absolute(loose['residual'][valid]) <= 1e-4).all()
+    assert pytest.approx(loose['iv'][valid], abs=1e-3) == result['iv'][valid]
+    capped = calcbsimpvol(args, diagnostics=True, max_iter=1)
+    assert (capped['iterations'] <= 1).all()
+    assert (capped['reason'][valid & (result['iterations'] > 1)] == NOT_CONVERGED).all()
+    assert REASONS[NOT_CONVERGED].startswith('not converged')
+    with pytest.raises(ValueError):
+        calcbsimpvol(args, tol=0.)
+
+
+@pytest.mark.parametrize('seed', ['rational', 'table'])
+@pytest.mark.filterwarnings('error')
+def test_float32(seed):
+    args, _ = synthetic_chain(10000)
+    args = [args[key] for key in ['cp', 'P', 'S', 'K', 'tau', 'r', 'q']]
+    expected = calcbsimpvol_flat(*args, seed=seed)
+    single = calcbsimpvol_flat(*args, seed=seed, dtype=np.float32)
+    assert single.dtype == np.float32
+    np.testing.assert_array_equal(np.isnan(single), np.isnan(expected))
+    valid = np.isfinite(expected)
+    # relative price tolerance of 1e-5, which leaves more room for options with little vega
+    assert np.median(np.absolute(single[valid] - expected[valid])) < 1e-6
+    assert pytest.approx(single[valid], abs=1e-3) == expected[valid]
+    refined = calcbsimpvol_flat(*args, seed=seed, dtype=np.float32, refine=True)
+    assert refined.dtype == np.float64
+    assert pytest.approx(refined, abs=1e-8, nan_ok=True) == expected
+
+
+def test_float32_out():
+    args = example_2_inputs()
+    out = np.empty(args['P'].shape, dtype=np.float32)
+    assert calcbsimpvol(args, out=out, dtype=np.float32) is out
+    assert pytest.approx(out, abs=1e-5, nan_ok=True) == expected_result_example_2
+    with pytest.raises(ValueError):
+        calcbsimpvol(args, out=np.empty(args['P'].shape), dtype=np.float32)
+    with pytest.raises(ValueError):
+        calcbsimpvol(args, dtype=np.float32, engine='jaeckel')
+    with pytest.raises(ValueError):
+        calcbsimpvol(args, dtype=np.float16)
+
+
+def test_parallel_identical_to_serial():
+    args, _ = synthetic_chain(1000)
+    args = [args[key] for key in ['cp', 'P', 'S', 'K', 'tau', 'r', 'q']]
+    serial = calcbsimpvol_flat(*args)
+    np.testing.assert_array_equal(calcbsimpvol_flat(*args, workers=4), serial)
+    np.testing.assert_array_equal(solve_chunked(_solve, args, workers=3, chunk_size=7), serial)
+    np.testing.assert_array_equal(solve_chunked(_solve, args, workers=1, chunk_size=100), serial)
+    single = calcbsimpvol_flat(*args, dtype=np.float32)
+    np.testing.assert_array_equal(calcbsimpvol_flat(*args, dtype=np.float32, workers=4), single)
+
+
+@pytest.mark.parametrize('engine, dtype', [
+    ('numpy', np.float64), ('numpy', np.float32), ('numba', np.float64), ('jaeckel', np.float64)
+])
+def test_memmap_chunked(tmp_path, engine, dtype):
+    if engine == 'numba':
+        pytest.importorskip('numba')
+    from numpy.lib.format import open_memmap
+    n = 5000
+    args, _ = synthetic_chain(n)
+    keys = ['cp', 'P', 'S', 'K', 'tau', 'r', 'q']
+    for key in keys:
+        np.save(str(tmp_path / '{}.npy'.format(key)), args[key])
+    columns = [np.load(str(tmp_path / '{}.npy'.format(key)), mmap_mode='r') for key in keys]
+    expected = calcbsimpvol_flat(*[args[key] for key in keys], engine=engine, dtype=dtype)
+
+    out = open_memmap(str(tmp_path / 'iv.npy'), mode='w+', dtype=dtype, shape=(n,))
+    calcbsimpvol_flat(*columns, engine=engine, dtype=dtype, out=out, chunk_size=700)
+    out.flush()
+    del out
+    np.testing.assert_array_equal(np.load(str(tmp_path / 'iv.npy')), expected)
+
+    diagnosed = calcbsimpvol_flat(*columns, engine=engine, dtype=dtype, chunk_size=700, diagnostics=True)
+    np.testing.assert_array_equal(diagnosed['iv'], expected)
+    assert (diagnosed['reason'] != CONVERGED).sum() == np.isnan(expected).sum()
+
+
+def test_chunked_memory():
+    import tracemalloc
+    n = 100000
+    args, _ = synthetic_chain(n)
+    out = np.empty(n)
+    calcbsimpvol_flat(out=out, chunk_size=2 ** 12, **args)
+    tracemalloc.start()
+    try:
+        calcbsimpvol_flat(out=out, chunk_size=2 ** 12, **args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # the work buffers are of the size of a chunk, unchunked they would take about 35 * n * 8 bytes
+    assert peak < 2 * n * 8
+
+
+def test_inputs_are_not_modified():
+    args = example_2_inputs()
+    args['K'] = args['K'].tolist()  # a nested list instead of an ndarray
+    for key in ['cp', 'P', 'tau', 'r', 'q']:
+        args[key].setflags(write=False)
+    snapshot = {key: np.array(value, copy=True) for key, value in args.items()}
+    identity = {key: id(value) for key, value in args.items()}
+    calcbsimpvol(args)
+    calcbsimpvol_flat(*[np.ravel(args[key]) for key in ['cp', 'P', 'S', 'K', 'tau', 'r', 'q']])
+    assert {key: id(value) for key, value in args.items()} == identity
+    for key, value in snapshot.items():
+        np.testing.assert_array_equal(np.asarray(args[key]), value)
+
+
+@pytest.mark.parametrize('greek, key, h', [
+    ('delta', 'S', 1e-4),
+    ('vega', 'sigma', 1e-6),
+    ('rho', 'r', 1e-6),
+    ('theta', 'tau', 1e-6),
+])
+def test_greeks_first_order(greek, key, h):
+    args, _ = synthetic_chain(200)
+    result = calcbsimpvol_flat(return_greeks=True, **args)
+    ok = ~np.isnan(result['iv'])
+    point = {k: args[k] for k in ['cp', 'S', 'K', 'tau', 'r', 'q']}
+    point['sigma'] = result['iv']
+    up, down = dict(point), dict(point)
+    up[key] = point[key] + h
+    down[key] = point[key] - h
+    fd = (black_scholes(**up) - black_scholes(**down)) / (2 * h)
+    if key == 'tau':
+        fd = -fd
+    assert pytest.approx(result[greek][ok], rel=1e-4, abs=1e-6) == fd[ok]
+
+
+@pytest.mark.parametrize('greek, key, delta_key, h', [
+    ('gamma', 'S', 'delta', 1e-4),
+    ('vanna', 'sigma', 'delta', 1e-6),
+    ('volga', 'sigma', 'vega', 1e-6),
+])
+def test_greeks_second_order(greek, key, delta_key, h):
+    args, _ = synthetic_chain(200)
+    result = calcbsimpvol(dict(args), return_greeks=True)
+    ok = ~np.isnan(result['iv'][:, 0])
+    sigma = result['iv'][:, 0]
+    up = {k: args[k] for k in ['cp', 'S', 'K', 'tau', 'r', 'q']}
+    down = dict(up)
+    if key == 'sigma':
+        up_sigma, down_sigma = sigma + h, sigma - h
+    else:
+        up_sigma = down_sigma = sigma
+        up[key] = up[key] + h
+        down[key] = down[key] - h
+    fd = (_greeks(sigma=up_sigma, **up)[delta_key] - _greeks(sigma=down_sigma, **down)[delta_key]) / (2 * h)
+    assert pytest.approx(result[greek][:, 0][ok], rel=1e-4, abs=1e-6) == fd[ok]
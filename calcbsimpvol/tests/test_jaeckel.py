@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import calcbsimpvol.data as bundled_data
+from calcbsimpvol import calcbsimpvol, calcbsimpvol_flat
+from calcbsimpvol.src.jaeckel import normalised_implied_volatility, _black, DBL_EPSILON
+from calcbsimpvol.benchmarks.chains import synthetic_chain
+from calcbsimpvol.tests.test_calcbsimpvol import example_2_inputs
+from calcbsimpvol.tests.test_examples import expected_result_example_2, MOE
+
+
+def test_example_2():
+    sigma = calcbsimpvol(example_2_inputs(), engine='jaeckel')
+    assert pytest.approx(sigma, abs=MOE, nan_ok=True) == expected_result_example_2
+
+
+@pytest.mark.parametrize('name', bundled_data.DATASETS)
+def test_bundled_data(name):
+    data = bundled_data.load(name)
+    for day in data:
+        args = [np.asarray(data[day][key], dtype=float) for key in bundled_data.FEED_KEYS]
+        sigma = calcbsimpvol_flat(*args, engine='jaeckel')
+        assert pytest.approx(sigma, abs=1e-10, nan_ok=True) == calcbsimpvol_flat(*args)
+
+
+def test_synthetic_chain():
+    args, sigma = synthetic_chain(10000)
+    iv = calcbsimpvol_flat(*[args[key] for key in bundled_data.FEED_KEYS], engine='jaeckel')
+    # the time value of a few deep in-the-money options is lost in the rounding of their price
+    valid = np.isfinite(iv)
+    assert np.mean(valid) > 0.999
+    assert np.mean(np.absolute(iv[valid] - sigma[valid]) < 1e-12) > 0.99
+
+
+def test_machine_precision_in_two_iterations():
+    # normalised prices from far out-of-the-money to close to the upper bound exp(x / 2)
+    rng = np.random.RandomState(0)
+    x = -np.concatenate([np.zeros(10), rng.uniform(0, 1, 500), 10 ** rng.uniform(-8, 2, 500)])
+    s = 10 ** rng.uniform(-2, 1, np.size(x))
+    beta = _black(x, s)
+    valid = (beta > 1e-300) & (beta < np.exp(0.5 * x))
+    s_implied = normalised_implied_volatility(beta[valid], x[valid])
+    assert np.max(np.absolute(s_implied - s[valid]) / s[valid]) < 1e-10
+    assert np.median(np.absolute(s_implied - s[valid]) / s[valid]) < 4 * DBL_EPSILON
+
+
+def test_outside_bounds():
+    x = np.asarray([-0.1, -0.1, -0.1, 0.])
+    beta = np.asarray([0., -1e-3, np.exp(-0.05), 1.])
+    assert np.isnan(normalised_implied_volatility(beta, x)).all()
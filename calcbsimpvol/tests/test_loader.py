@@ -0,0 +1,97 @@
+import json
+import os
+import zipfile
+
+import numpy as np
+import pytest
+
+from calcbsimpvol import data
+from calcbsimpvol.data.loader import iter_days, read_columns, split_days, load_columns, read_cache
+
+
+def write_zip(file_path, text):
+    with zipfile.ZipFile(file_path, 'w') as zf:
+        zf.writestr('data.json', text)
+    return str(file_path)
+
+
+@pytest.mark.parametrize('name', data.DATASETS)
+def test_read_columns_matches_json(name):
+    expected = data.load(name)
+    columns = read_columns(name)
+    assert list(columns['days']) == list(expected)
+    for day, fields in split_days(columns):
+        for key, values in expected[day].items():
+            np.testing.assert_array_equal(fields[key], np.asarray(values, dtype=float))
+    for column in columns['columns'].values():
+        assert column.flags.c_contiguous
+        assert column.shape == (columns['offsets'][-1],)
+
+
+def test_read_columns_layout(tmp_path):
+    text = json.dumps({
+        'd1': {'P': [1.5, None, 2e-3], 'cp': [1, -1, 1], 'S': 100, 'flag': [True, False, True], 'name': ['a', 'b', 'c']},
+        'd2': {'P': [], 'cp': []},
+        'd3': {'P': [4.], 'S': -1.5e2},
+    }, indent=2)
+    columns = read_columns(write_zip(tmp_path / 'layout.json.zip', text))
+    assert list(columns['days']) == ['d1', 'd2', 'd3']
+    np.testing.assert_array_equal(columns['offsets'], [0, 3, 3, 4])
+    assert sorted(columns['columns']) == ['P', 'S', 'cp', 'flag']
+    np.testing.assert_array_equal(columns['columns']['P'], [1.5, np.nan, 2e-3, 4.])
+    np.testing.assert_array_equal(columns['columns']['S'], [100., 100., 100., -150.])
+    np.testing.assert_array_equal(columns['columns']['cp'], [1., -1., 1., np.nan])
+    np.testing.assert_array_equal(columns['columns']['flag'], [1., 0., 1., np.nan])
+
+    columns = read_columns(write_zip(tmp_path / 'layout.json.zip', text), keys=['P', 'K'])
+    assert list(columns['columns']) == ['P', 'K']
+    assert np.isnan(columns['columns']['K']).all()
+
+    with pytest.raises(ValueError):
+        read_columns(write_zip(tmp_path / 'ragged.json.zip', json.dumps({'d1': {'P': [1., 2.], 'K': [1.]}})))
+
+
+@pytest.mark.parametrize('chunk_size', [7, 2 ** 20])
+def test_iter_days_nested(tmp_path, chunk_size):
+    # nested objects and strings with braces are skipped, they do not start a day
+    text = json.dumps({
+        'd1': {'meta': {'source': '{"d9": [1]}', 'P': [0.]}, 'P': [1., 2.], 'note': 'a } b'},
+        'd2': {'P': [3.], 'K': [[1.], [2.]]},
+    })
+    days = list(iter_days(write_zip(tmp_path / 'nested.json.zip', text), chunk_size=chunk_size))
+    assert [day for day, _ in days] == ['d1', 'd2']
+    assert list(days[0][1]) == ['P']
+    np.testing.assert_array_equal(days[0][1]['P'], [1., 2.])
+    np.testing.assert_array_equal(days[1][1]['P'], [3.])
+
+    for text in ['{"d1": [1.0, 2.0]}', '[{"P": [1.]}]', '{"d1": {"P": [1.]}']:
+        with pytest.raises(ValueError):
+            list(iter_days(write_zip(tmp_path / 'broken.json.zip', text), chunk_size=chunk_size))
+
+
+def test_load_columns_cache(tmp_path):
+    source = write_zip(tmp_path / 'source.json.zip', json.dumps({'d1': {'P': [1., 2.]}, 'd2': {'P': [3.]}}))
+    cache = str(tmp_path / 'cache')
+    columns = load_columns(source, cache=cache)
+    assert isinstance(columns['columns']['P'], np.memmap)
+    assert not columns['columns']['P'].flags.writeable
+    np.testing.assert_array_equal(columns['columns']['P'], [1., 2., 3.])
+    meta = os.path.join(cache, 'meta.json')
+    built = os.stat(meta).st_mtime_ns
+    np.testing.assert_array_equal(load_columns(source, cache=cache)['columns']['P'], [1., 2., 3.])
+    assert os.stat(meta).st_mtime_ns == built
+    assert read_cache(cache) is not None
+
+    # a changed source rebuilds the cache
+    os.remove(source)
+    os.rename(write_zip(tmp_path / 'other.json.zip', json.dumps({'d1': {'P': [9.]}})), source)
+    os.utime(source, ns=(0, 0))
+    np.testing.assert_array_equal(load_columns(source, cache=cache, mmap_mode=None)['columns']['P'], [9.])
+
+
+def test_load_columns_feed(tmp_path):
+    columns = load_columns('spy_20190118', keys=data.FEED_KEYS, cache=str(tmp_path / 'spy'))
+    assert list(columns['columns']) == list(data.FEED_KEYS)
+    expected = data.load('spy_20190118')
+    for day, fields in split_days(columns):
+        np.testing.assert_array_equal(fields['P'], expected[day]['P'])
@@ -0,0 +1,102 @@
+import threading
+
+import numpy as np
+import pytest
+from calcbsimpvol import calcbsimpvol, calcbsimpvol_flat, ImpliedVolSolver, Profile
+from calcbsimpvol.src import profiling
+from calcbsimpvol.benchmarks.chains import synthetic_chain
+from calcbsimpvol.tests.test_calcbsimpvol import example_2_inputs
+
+
+def test_profile_records_stages():
+    args = example_2_inputs()
+    with Profile() as profile:
+        sigma = calcbsimpvol(args, return_greeks=True)['iv']
+    stages = [record['stage'] for record in profile.records]
+    assert stages[:4] == ['coercion', 'forward', 'normalisation', 'seed']
+    assert stages[-1] == 'greeks'
+    iterations = [record for record in profile.records if record['stage'] == 'iteration']
+    assert [record['iteration'] for record in iterations] == list(range(len(iterations)))
+    active = [record['active'] for record in iterations]
+    # options without an implied volatility are dropped after the first evaluation
+    assert active[0] == sigma.size
+    assert active[1] <= sigma.size - np.isnan(sigma).sum()
+    assert active == sorted(active, reverse=True)
+    assert all(record['seconds'] >= 0 for record in profile.records)
+
+    summary = profile.summary()
+    assert summary['seed']['calls'] == 1
+    assert summary['seed']['active'] == sigma.size
+    assert len(summary['iteration']) == len(iterations)
+
+
+def test_profile_disabled():
+    args = example_2_inputs()
+    with Profile() as profile:
+        pass
+    calcbsimpvol(args)
+    assert profile.records == []
+    with pytest.raises(ValueError):
+        with Profile():
+            calcbsimpvol(args, engine='unknown')
+    assert profiling._active() == ()
+    assert profiling._start() is None
+
+
+@pytest.mark.parametrize('engine', ['numba', 'jaeckel'])
+def test_profile_engines(engine):
+    if engine == 'numba':
+        pytest.importorskip('numba')
+    args, _ = synthetic_chain(100)
+    records = []
+    with Profile(callback=records.append) as profile:
+        calcbsimpvol_flat(engine=engine, **args)
+    assert profile.records == []
+    assert [record['stage'] for record in records] == ['coercion', 'forward', 'normalisation', 'solve']
+
+
+def test_profile_allocations():
+    n = 5000
+    args, _ = synthetic_chain(n)
+    solver = ImpliedVolSolver(n)
+    with Profile() as profile:
+        solver.solve(args)
+    assert profile.summary()['seed']['allocated'] > n * 8
+    with Profile() as profile:
+        solver.solve(args)
+    assert all(record['allocated'] == 0 for record in profile.records)
+
+
+def test_profile_workers(monkeypatch):
+    from calcbsimpvol.src import parallel
+    monkeypatch.setattr(parallel, 'CHUNK_SIZE', 1000)
+    args, _ = synthetic_chain(3000)
+    with Profile() as profile:
+        calcbsimpvol_flat(workers=2, **args)
+    assert profile.summary()['seed']['calls'] == 3
+    assert profile.summary()['seed']['active'] == 3000
+
+
+def test_profile_threads():
+    # each profile records the solves of its own thread only
+    sizes = [1000, 3000]
+    profiles = [None, None]
+    barrier = threading.Barrier(2)
+
+    def run(i):
+        args, _ = synthetic_chain(sizes[i])
+        with Profile() as profile:
+            barrier.wait()
+            for _ in range(5):
+                calcbsimpvol_flat(**args)
+            barrier.wait()
+        profiles[i] = profile
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for n, profile in zip(sizes, profiles):
+        seed = profile.summary()['seed']
+        assert (seed['calls'], seed['active']) == (5, 5 * n)
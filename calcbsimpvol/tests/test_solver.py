@@ -0,0 +1,102 @@
+import tracemalloc
+import numpy as np
+import pytest
+from calcbsimpvol import calcbsimpvol, calcbsimpvol_flat, ImpliedVolSolver, Profile
+from calcbsimpvol.benchmarks.chains import synthetic_chain
+from calcbsimpvol.tests.test_calcbsimpvol import example_2_inputs
+
+
+def test_solver_matches_calcbsimpvol():
+    args = example_2_inputs()
+    solver = ImpliedVolSolver(args['P'].shape)
+    expected = calcbsimpvol(example_2_inputs())
+    for _ in range(3):
+        np.testing.assert_array_equal(solver.solve(args), expected)
+
+
+def test_solver_out():
+    args, _ = synthetic_chain(500)
+    solver = ImpliedVolSolver(500)
+    out = np.empty(500)
+    assert solver.solve(args, out=out) is out
+    np.testing.assert_array_equal(out, calcbsimpvol_flat(**args))
+    with pytest.raises(ValueError):
+        solver.solve(args, out=np.empty(499))
+
+
+@pytest.mark.parametrize('seed', ['rational', 'table'])
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_solver_does_not_allocate_after_warm_up(seed, dtype):
+    n = 20000
+    args, _ = synthetic_chain(n)
+    solver = ImpliedVolSolver(n, seed=seed, dtype=dtype)
+    out = np.empty(n, dtype=dtype)
+    solver.solve(args, out=out)
+    tracemalloc.start()
+    try:
+        solver.solve(args, out=out)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # far less than a single array of the size of the chain
+    assert peak < n * 8 / 10
+
+
+def test_warm_start():
+    args, sigma = synthetic_chain(2000)
+    cold = calcbsimpvol_flat(**args)
+    sigma0 = sigma.copy()
+    sigma0[::10] = np.nan  # falls back to the rational initial guess
+    sigma0[1::10] = -1.
+    warm = calcbsimpvol_flat(sigma0=sigma0, **args)
+    both = ~np.isnan(cold) & ~np.isnan(warm)
+    assert np.sum(both) > 1900
+    assert pytest.approx(warm[both], abs=1e-6) == cold[both]
+    warm_parallel = calcbsimpvol_flat(sigma0=sigma0, workers=2, **args)
+    np.testing.assert_array_equal(warm_parallel, warm)
+
+
+def test_incremental():
+    args, sigma = synthetic_chain(2000)
+    solver = ImpliedVolSolver(2000)
+    first = solver.solve(args)
+    changed = np.zeros(2000, dtype=bool)
+    changed[::7] = True
+    args['P'] = np.where(changed, args['P'] * 1.01, args['P'])
+    update = solver.solve(args, incremental=True)
+    np.testing.assert_array_equal(update[~changed], first[~changed])
+    cold = calcbsimpvol_flat(**args)
+    both = ~np.isnan(cold) & ~np.isnan(update)
+    assert np.sum(both[changed]) > 250
+    assert pytest.approx(update[both], abs=1e-6) == cold[both]
+
+
+def test_incremental_does_not_allocate_after_warm_up():
+    n = 20000
+    args, _ = synthetic_chain(n)
+    args['P'][::100] = np.nan
+    solver = ImpliedVolSolver(n)
+    out = np.empty(n)
+    solver.solve(args, out=out)
+    args['P'][1::50] *= 1.01
+    solver.solve(args, out=out, incremental=True)
+    args['P'][1::50] /= 1.01
+    tracemalloc.start()
+    try:
+        solver.solve(args, out=out, incremental=True)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < n * 8 / 10
+
+
+def test_incremental_nan_unchanged():
+    args, _ = synthetic_chain(2000)
+    args['P'][::10] = np.nan
+    solver = ImpliedVolSolver(2000)
+    first = solver.solve(args).copy()
+    # NaN quotes which stay NaN are not re-solved
+    with Profile() as profile:
+        update = solver.solve(args, incremental=True)
+    assert 'forward' not in profile.summary()
+    np.testing.assert_array_equal(update, first)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from calcbsimpvol import calcbsimpvol_flat, solve_stream
+from calcbsimpvol.data import FEED_KEYS
+from calcbsimpvol.data.loader import iter_days, read_columns
+
+
+@pytest.mark.parametrize('batch_size', [None, 1000, 57])
+@pytest.mark.parametrize('prefetch', [0, 2])
+def test_solve_stream_matches_calcbsimpvol(batch_size, prefetch):
+    columns = read_columns('cl_20171115', FEED_KEYS)
+    expected = calcbsimpvol_flat(*[columns['columns'][key] for key in FEED_KEYS])
+    batches = (dict(fields, day=day) for day, fields in iter_days('cl_20171115', FEED_KEYS))
+    results = list(solve_stream(batches, batch_size=batch_size, prefetch=prefetch))
+    if batch_size is None:
+        assert len(results) == len(columns['days'])
+    else:
+        assert all(len(sigma) == batch_size for _, sigma in results[:-1])
+    np.testing.assert_array_equal(np.concatenate([sigma for _, sigma in results]), expected)
+    np.testing.assert_array_equal(np.concatenate([batch['K'] for batch, _ in results]), columns['columns']['K'])
+    days = np.concatenate([batch['day'] for batch, _ in results])
+    np.testing.assert_array_equal(days, np.repeat(columns['days'], np.diff(columns['offsets'])))
+
+
+def test_solve_stream_scalars():
+    batches = [
+        dict(cp=1, P=[10.4506, 6.0401], S=100., K=[100., 110.], tau=1., r=0.05, q=0.),
+        dict(cp=-1, P=[5.5735], S=100., K=100., tau=1., r=0.05, q=0.),
+    ]
+    results = list(solve_stream(batches, batch_size=2))
+    assert [len(sigma) for _, sigma in results] == [2, 1]
+    np.testing.assert_allclose(np.concatenate([sigma for _, sigma in results]), 0.2, atol=1e-4)
+    np.testing.assert_array_equal(results[0][0]['cp'], [1, 1])
+
+
+@pytest.mark.parametrize('batch_size', [None, 2])
+def test_solve_stream_empty_batch(batch_size):
+    batches = [
+        dict(cp=1, P=[10.4506], S=100., K=[100.], tau=1., r=0.05, q=0.),
+        dict(cp=1, P=[], S=100., K=[], tau=1., r=0.05, q=0.),
+        dict(cp=-1, P=[5.5735], S=100., K=100., tau=1., r=0.05, q=0.),
+    ]
+    results = list(solve_stream(batches, batch_size=batch_size))
+    if batch_size is None:
+        assert [len(sigma) for _, sigma in results] == [1, 0, 1]
+    np.testing.assert_allclose(np.concatenate([sigma for _, sigma in results]), 0.2, atol=1e-4)
+
+
+def test_solve_stream_errors():
+    def batches():
+        yield dict(cp=1, P=10.4506, S=100., K=100., tau=1., r=0.05, q=0.)
+        raise IOError('connection lost')
+
+    stream = solve_stream(batches())
+    next(stream)
+    with pytest.raises(IOError):
+        next(stream)
+    with pytest.raises(ValueError):
+        next(solve_stream([], batch_size=0))
+
+
+def test_solve_stream_close():
+    produced = []
+
+    def batches():
+        for i in range(100):
+            produced.append(i)
+            yield dict(cp=1, P=10.4506, S=100., K=100., tau=1., r=0.05, q=0.)
+
+    stream = solve_stream(batches(), prefetch=2)
+    next(stream)
+    stream.close()
+    time.sleep(0.3)
+    # read ahead by at most the queue and the item blocked in it
+    assert len(produced) <= 5
+    assert not any(thread.name == 'calcbsimpvol-prefetch' for thread in threading.enumerate())
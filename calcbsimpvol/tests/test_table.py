@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from calcbsimpvol import calcbsimpvol, calcbsimpvol_flat
+from calcbsimpvol.src import table
+from calcbsimpvol.src.calcbsimpvol import _seed
+from calcbsimpvol.src.jaeckel import _black
+from calcbsimpvol.benchmarks.chains import synthetic_chain
+from calcbsimpvol.tests.test_calcbsimpvol import example_2_inputs
+from calcbsimpvol.tests.test_examples import expected_result_example_2, MOE
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'numba'])
+def test_same_result_as_rational_seed(engine):
+    if engine == 'numba':
+        pytest.importorskip('numba')
+    sigma = calcbsimpvol(example_2_inputs(), engine=engine, seed='table')
+    assert pytest.approx(sigma, abs=MOE, nan_ok=True) == expected_result_example_2
+    args, _ = synthetic_chain(1000)
+    args = [args[key] for key in ['cp', 'P', 'S', 'K', 'tau', 'r', 'q']]
+    rational = calcbsimpvol_flat(*args, engine=engine)
+    tabulated = calcbsimpvol_flat(*args, engine=engine, seed='table')
+    both = np.isfinite(rational)
+    assert np.all(np.isfinite(tabulated[both]))
+    # both stop within the price tolerance, which leaves some room for options with little vega
+    assert pytest.approx(tabulated[both], abs=1e-6) == rational[both]
+
+
+@pytest.mark.filterwarnings('error')
+@pytest.mark.parametrize('engine', ['numpy', 'numba', 'jaeckel'])
+def test_no_time_to_expiry(engine):
+    if engine == 'numba':
+        pytest.importorskip('numba')
+    sigma = calcbsimpvol_flat(1, np.asarray([5., 5.]), 100., 100., np.asarray([0., 1.]), 0.01, 0., engine=engine, seed='table')
+    assert np.isnan(sigma[0])
+    assert sigma[1] == pytest.approx(0.11304388, abs=1e-8)
+
+
+def test_seed():
+    rng = np.random.RandomState(0)
+    x = rng.uniform(table.X_MIN, 0, 1000)
+    v = rng.uniform(0.05, 2, 1000)
+    c = _black(x, v) * np.exp(-0.5 * x)
+    inside = (c >= np.exp(table.U_MIN)) & (c <= np.exp(table.U_MAX))
+    v_seed = table.seed(x, c)
+    assert np.max(np.absolute(v_seed[inside] - v[inside]) / v[inside]) < 0.05
+    assert np.median(np.absolute(v_seed[inside] - v[inside]) / v[inside]) < 1e-3
+    # outside of the grid the rational initial guess is used
+    x = np.asarray([-5., -0.2, np.nan])
+    c = np.asarray([1e-3, 0.995, 0.1])
+    np.testing.assert_array_equal(table.seed(x, c), _seed(x, c))
+
+
+def test_disk_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / 'seed_table.npy')
+    monkeypatch.setattr(table, '_table', None)
+    saved = table.get(path)
+    assert saved.shape == (table.X_NODES, table.U_NODES)
+    monkeypatch.setattr(table, '_table', None)
+    monkeypatch.setattr(table, 'build', None)  # must not be rebuilt
+    np.testing.assert_array_equal(table.get(path), saved)
+    assert table.get() is table.get(path)
+
+
+def test_unknown_seed():
+    with pytest.raises(ValueError):
+        calcbsimpvol(example_2_inputs(), seed='spline')
@@ -21,9 +21,11 @@
 # q(tau) == r(tau)
 ### b) vector wise (single expiry)
 """
+import numpy as np
 import pytest
 from scipy.stats import norm
 from calcbsimpvol.src import _fcnN, _fcnn
+from calcbsimpvol.src.calcbsimpvol import _fcnv, _seed, _SEED_PARTITION
 
 
 @pytest.mark.parametrize(
@@ -39,3 +41,34 @@ def test__fcnN(x):
 def test__fcnn(x):
     assert _fcnn(x) == pytest.approx(norm.pdf(x), rel=0.000000000001)
 
+
+
+def test__fcnv():
+    # Eq. (19) of Li (2006) as the original implementation evaluated it: a sum over the 14 terms
+    # n_k * x ** i_k * sqrt(c) ** j_k, with the coefficients in the order of the paper
+    p = [-0.969271876255, 0.097428338274, 1.750081126685]
+    m = [6.268456292246, -6.284840445036, 30.068281276567, -11.780036995036, -2.310966989723, -11.473184324152,
+         -230.101682610568, 86.127219899668, 3.730181294225, -13.954993561151, 261.950288864225,
+         20.090690444187, -50.117067019539, 13.723711519422]
+    n = [-0.068098378725, 0.440639436211, -0.263473754689, -5.792537721792, -5.267481008429, 4.714393825758,
+         3.529944137559, -23.636495876611, -9.020361771283, 14.749084301452, -32.570660102526,
+         76.398155779133, 41.855161781749, -12.150611865704]
+    i = [0, 1, 0, 1, 2, 0, 1, 2, 3, 0, 1, 2, 3, 4]
+    j = [1, 0, 2, 1, 0, 3, 2, 1, 0, 4, 3, 2, 1, 0]
+    x, c = np.meshgrid(np.linspace(-0.5, 0., 51), np.linspace(0., 1., 51))
+    x, c = np.ravel(x)[:, None], np.ravel(c)[:, None]
+    terms = x ** np.asarray(i) * np.sqrt(c) ** np.asarray(j)
+    expected = p[0] * x[:, 0] + p[1] * np.sqrt(c[:, 0]) + p[2] * c[:, 0] + \
+        np.sum(np.asarray(n) * terms, 1) / (1 + np.sum(np.asarray(m) * terms, 1))
+    assert pytest.approx(_fcnv(x[:, 0], c[:, 0]), rel=1e-12, abs=1e-12) == expected
+
+
+@pytest.mark.parametrize('n', [144, _SEED_PARTITION + 1])
+def test__seed(n):
+    # both domains on the full grid, the partitioned evaluation gives the same bits
+    rng = np.random.RandomState(0)
+    x = rng.normal(0., 0.6, n)
+    c = rng.uniform(-0.01, 0.4, n)
+    v = np.where(x <= 0, _fcnv(x, np.maximum(c, 0)), _fcnv(-x, np.maximum(np.exp(x) * c + 1 - np.exp(x), 0)))
+    inside = (x >= -0.5) & (x <= 0.5) & (v > 0) & (v < 1) & (x / v <= 2) & (x / v >= -2)
+    np.testing.assert_array_equal(_seed(x, c), np.where(inside, v, 0.8))
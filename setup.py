@@ -36,8 +36,9 @@ setup(
     ],
     keywords='options implied volatility option iv ivol options-on-futures ivsurface black-scholes',
     install_requires=['numpy', 'scipy', 'matplotlib'],
+    extras_require={'numba': ['numba']},
     packages=find_packages(exclude=['calcbsimpvol.tests*', 'calcbsimpvol.docs']),
-    package_data={'calcbsimpvol.data': ['*.json']},
+    package_data={'calcbsimpvol.data': ['*.json.zip']},
     project_urls={
         'Documentation': 'https://erkandem.github.io/calcbsimpvol/',
         'Bug Reports': 'https://github.com/erkandem/calcbsimpvol/issues',